@@ -10,14 +10,16 @@ bl_info = {
     "category": "Import-Export",
 }
 
-from . import ldraw_props
-from . import operator_import
-from . import operator_export
-from . import operator_panel_ldraw
-from . import ldraw_operators
-
 
+# the blender modules are imported when the addon is registered
+# so that files can be read without blender, see ldraw_placements.py
 def register():
+    from . import ldraw_props
+    from . import operator_import
+    from . import operator_export
+    from . import operator_panel_ldraw
+    from . import ldraw_operators
+
     ldraw_props.register()
     operator_import.register()
     operator_export.register()
@@ -26,6 +28,12 @@ def register():
 
 
 def unregister():
+    from . import ldraw_props
+    from . import operator_import
+    from . import operator_export
+    from . import operator_panel_ldraw
+    from . import ldraw_operators
+
     ldraw_props.unregister()
     operator_import.unregister()
     operator_export.unregister()
@@ -7,17 +7,44 @@ from .blender_materials import BlenderMaterials
 from .ldraw_file import LDrawFile
 from .ldraw_node import LDrawNode
 from .filesystem import FileSystem
+from .frustum import Frustum
 from .ldraw_color import LDrawColor
 from . import blender_camera
+from . import geometry_pool
+from . import geometry_spill
 from . import helpers
 from . import strings
 from . import group
 from . import ldraw_meta
+from . import ldraw_mesh
 from . import ldraw_object
 from . import matrices
-
-
-def do_import(filepath, color_code="16", return_mesh=False):
+from . import occlusion_culling
+from . import part_lod
+from . import stud_culling
+
+
+# progress_callback is called with the name of the current phase and how much of it is done from 0 to 1
+# if it returns False the import is stopped where it is and None is returned
+# frustum is a Frustum in blender's coordinates before import_scale, parts outside of it are not created
+# it's used instead of the one from camera_culling
+def do_import(filepath, color_code="16", return_mesh=False, progress_callback=None, frustum=None):
+    steps = iter_import(filepath, color_code=color_code, return_mesh=return_mesh, frustum=frustum)
+    while True:
+        try:
+            phase, progress = next(steps)
+        except StopIteration as e:
+            return e.value
+        if progress_callback is not None and progress_callback(phase, progress) is False:
+            steps.close()
+            return None
+
+
+# import one step at a time so the caller can do other things in between, like keep blender responsive
+# yields the current phase and how much of it is done from 0 to 1
+# returns what do_import returns
+# closing the generator stops the import, whatever was already created is left as it is
+def iter_import(filepath, color_code="16", return_mesh=False, frustum=None):
     print(filepath)  # TODO: multiple filepaths?
 
     ImportSettings.save_settings()
@@ -30,32 +57,74 @@ def do_import(filepath, color_code="16", return_mesh=False):
     LDrawNode.reset_caches()
     group.reset_caches()
     ldraw_meta.reset_caches()
+    ldraw_mesh.reset_caches()
     ldraw_object.reset_caches()
     matrices.reset_caches()
+    geometry_spill.reset_caches()
+    stud_culling.reset_caches()
+    occlusion_culling.reset_caches()
+    part_lod.reset_caches()
 
     __scene_setup()
 
+    yield "Reading files", 0.0
+
     FileSystem.build_search_paths(parent_filepath=filepath)
+    yield "Reading files", 0.0
+
     LDrawFile.read_color_table()
+    yield "Reading files", 0.0
+
     BlenderMaterials.create_blender_node_groups()
+    yield "Reading files", 0.0
+
+    for progress in LDrawFile.iter_parse(filepath):
+        yield "Reading files", progress
 
     ldraw_file = LDrawFile.get_file(filepath)
     if ldraw_file is None:
-        return
+        return None
 
     if ldraw_file.is_configuration():
         __load_materials(ldraw_file)
-        return
+        return None
 
     root_node = LDrawNode()
     root_node.is_root = True
     root_node.file = ldraw_file
 
+    if frustum is None and ImportOptions.camera_culling and not return_mesh:
+        frustum = __get_culling_frustum(ldraw_file)
+    LDrawNode.frustum = frustum
+
+    if part_lod.is_used():
+        camera = __get_culling_camera(ldraw_file)
+        if camera is not None:
+            part_lod.set_camera(camera)
+
+    for progress in geometry_pool.build_geometry_datas(root_node):
+        yield "Building parts", progress
+
+    # every part has to be placed before any of them can be loaded to know which studs are covered
+    if stud_culling.is_used():
+        stud_culling.add_anti_studs(ldraw_file)
+
+    if occlusion_culling.is_used() and not return_mesh:
+        occlusion_culling.build_grid(ldraw_file, color_code=color_code)
+
     group.groups_setup(filepath)
     ldraw_meta.meta_step()
 
     # return root_node.load()
-    obj = root_node.load(color_code=color_code, return_mesh=return_mesh)
+    yield "Creating parts", 0.0
+    steps = root_node.iter_load(color_code=color_code, return_mesh=return_mesh)
+    while True:
+        try:
+            progress = next(steps)
+        except StopIteration as e:
+            obj = e.value
+            break
+        yield "Creating parts", progress
 
     # s = {str(k): v for k, v in sorted(LDrawNode.geometry_datas2.items(), key=lambda ele: ele[1], reverse=True)}
     # helpers.write_json("gs2.json", s, indent=4)
@@ -73,6 +142,11 @@ def do_import(filepath, color_code="16", return_mesh=False):
                 max_clip_end = camera.data.clip_end
             bpy.context.scene.camera = camera
 
+    # make sure the whole model can be seen from far enough away to fit it in view
+    model_clip_end = matrices.bounds_diagonal(LDrawNode.bounds) * ImportOptions.import_scale * 2
+    if model_clip_end > max_clip_end:
+        max_clip_end = model_clip_end
+
     for area in bpy.context.screen.areas:
         if area.type == "VIEW_3D":
             for space in area.spaces:
@@ -84,6 +158,28 @@ def do_import(filepath, color_code="16", return_mesh=False):
     return obj
 
 
+# the camera named culling_camera, or the first camera if it's empty
+# cameras are read before the model is loaded because the parts that come before them have to be culled too
+# the cameras of the model itself are transformed into blender's coordinates like load does with them
+def __get_culling_camera(ldraw_file):
+    cameras = ldraw_meta.read_leocad_cameras(ldraw_file, matrices.rotation_matrix)
+    if ImportOptions.culling_camera != "":
+        cameras = [camera for camera in cameras if camera.name == ImportOptions.culling_camera]
+    if len(cameras) < 1:
+        return None
+    return cameras[0]
+
+
+def __get_culling_frustum(ldraw_file):
+    camera = __get_culling_camera(ldraw_file)
+    if camera is None:
+        return None
+
+    render = bpy.context.scene.render
+    aspect_ratio = (render.resolution_x * render.pixel_aspect_x) / (render.resolution_y * render.pixel_aspect_y)
+    return Frustum.from_camera(camera, aspect_ratio=aspect_ratio)
+
+
 def __scene_setup():
     bpy.context.scene.eevee.use_ssr = True
     bpy.context.scene.eevee.use_ssr_refraction = True
@@ -147,7 +243,7 @@ def __load_materials(file):
 
     colors = {}
     group_name = 'blank'
-    for line in file.lines:
+    for line in file.read_lines():
         clean_line = helpers.clean_line(line)
         strip_line = line.strip()
 
@@ -111,11 +111,14 @@ class FileSystem:
 
     search_dirs = []
     lowercase_paths = {}
+    # resolution: the primitive folders of that resolution, searched before search_dirs when a file is located with it
+    resolution_dirs = {}
 
     @classmethod
     def reset_caches(cls):
         cls.search_dirs.clear()
         cls.lowercase_paths.clear()
+        cls.resolution_dirs.clear()
 
     @classmethod
     def build_search_paths(cls, parent_filepath=None):
@@ -163,6 +166,10 @@ class FileSystem:
             path = os.path.join(root, "p")
             cls.append_search_path(path)
 
+            # lowercase paths of these are already added with p
+            cls.resolution_dirs.setdefault("High", []).append(os.path.join(root, "p", "48"))
+            cls.resolution_dirs.setdefault("Low", []).append(os.path.join(root, "p", "8"))
+
             if cls.resolution_value() == "High":
                 path = os.path.join(root, "p", "48")
                 cls.append_search_path(path)
@@ -196,8 +203,9 @@ class FileSystem:
         for file in files:
             cls.lowercase_paths.setdefault(file.lower(), file)
 
+    # resolution is one of the values of resolution_choices to look for the primitives of that resolution first
     @classmethod
-    def locate(cls, filename):
+    def locate(cls, filename, resolution=None):
         part_path = filename.replace("\\", os.path.sep).replace("/", os.path.sep)
         part_path = os.path.expanduser(part_path)
 
@@ -205,7 +213,7 @@ class FileSystem:
         if os.path.isfile(part_path):
             return part_path
 
-        for dir in cls.search_dirs:
+        for dir in cls.resolution_dirs.get(resolution, []) + cls.search_dirs:
             full_path = os.path.join(dir, part_path)
             if os.path.isfile(full_path):
                 return full_path
@@ -0,0 +1,63 @@
+import math
+import numpy as np
+
+
+# the space a camera can see, as the planes around it
+# planes is a (n, 4) array of a normal that points inside and a distance, so a point is inside a plane if point dot normal + distance >= 0
+class Frustum:
+    def __init__(self, planes):
+        self.planes = np.array(planes, dtype=np.float64).reshape(-1, 4)
+
+    # camera is an LDrawCamera in the space parts are placed in, before import_scale
+    # aspect_ratio is width / height of what is rendered, fov is the vertical field of view like blender_camera uses it
+    @staticmethod
+    def from_camera(camera, aspect_ratio=1.0):
+        position = np.array(camera.position, dtype=np.float64)
+        forward = Frustum.__normalized(np.array(camera.target_position, dtype=np.float64) - position)
+        # the same up that blender_camera points the camera with
+        up = Frustum.__normalized(np.array(camera.up_vector, dtype=np.float64))
+        for fallback_up in [(0.0, 0.0, 1.0), (1.0, 0.0, 0.0)]:
+            if abs(forward.dot(up)) <= 0.9999:
+                break
+            up = np.array(fallback_up)
+        up = Frustum.__normalized(up - up.dot(forward) * forward)
+        right = np.cross(forward, up)
+
+        planes = [
+            np.append(forward, -forward.dot(position) - camera.z_near),
+            np.append(-forward, forward.dot(position) + camera.z_far),
+        ]
+
+        if camera.orthographic:
+            # the same size blender_camera gives the camera
+            half_height = np.linalg.norm(position - np.array(camera.target_position, dtype=np.float64)) / 1.92 / 2
+            half_width = half_height * aspect_ratio
+            for normal, half_size in [(right, half_width), (-right, half_width), (up, half_height), (-up, half_height)]:
+                planes.append(np.append(normal, half_size - normal.dot(position)))
+        else:
+            tan_height = math.tan(math.radians(camera.fov) / 2)
+            tan_width = tan_height * aspect_ratio
+            for side, tan in [(right, tan_width), (-right, tan_width), (up, tan_height), (-up, tan_height)]:
+                normal = forward * tan + side
+                planes.append(np.append(normal, -normal.dot(position)))
+
+        return Frustum(planes)
+
+    # whether any of bounds, a (2, 3) array of min and max, might be inside
+    # bounds is outside if all of it is outside of any one plane
+    # bounds of None has nothing to test, so it's always inside
+    def intersects_bounds(self, bounds):
+        if bounds is None:
+            return True
+        normals = self.planes[:, :3]
+        # the corner of bounds that is furthest inside each plane
+        corners = np.where(normals >= 0, bounds[1], bounds[0])
+        distances = np.einsum('ij,ij->i', normals, corners) + self.planes[:, 3]
+        return bool(np.all(distances >= 0))
+
+    @staticmethod
+    def __normalized(vector):
+        length = np.linalg.norm(vector)
+        if length == 0:
+            return vector
+        return vector / length
@@ -1,67 +1,203 @@
+import array
+import hashlib
+import os
+
+import numpy as np
+
+from . import matrices
+
+
 class FaceData:
     """
-    Raw vertex information
+    Raw vertex information of every face, edge or line of a geometry_data packed into typed buffers
     """
 
-    def __init__(self, vertices, color_code, texmap=None, pe_texmap=None):
-        self.vertices = vertices
-        self.color_code = color_code
-        self.texmap = texmap
-        self.pe_texmap = pe_texmap
+    # color codes are stored as ids so that they fit in an int32 buffer
+    # this is never cleared so that ids stay valid for as long as any geometry_data exists
+    # 16 is always 0 so that faces that take the color of their part can be found without a lookup
+    color_codes = ["16"]
+    color_ids = {"16": 0}
+
+    # the typed buffers, in the order they are written by spill
+    buffer_names = ["vertices", "offsets", "sizes", "color_ids", "texmap_ids", "pe_texmap_ids"]
+
+    def __init__(self):
+        self.vertices = array.array("f")  # x, y, z of every vertex
+        self.offsets = array.array("i")  # index of the first vertex of each item
+        self.sizes = array.array("i")  # number of vertices of each item
+        self.color_ids = array.array("i")
+        self.texmap_ids = array.array("i")  # index into texmaps or -1
+        self.pe_texmap_ids = array.array("i")  # index into pe_texmaps or -1
+        self.texmaps = []
+        self.pe_texmaps = []
+        self.__texmap_ids = {}
+
+    def __len__(self):
+        return len(self.sizes)
+
+    @classmethod
+    def get_color_id(cls, color_code):
+        color_id = cls.color_ids.get(color_code)
+        if color_id is None:
+            color_id = len(cls.color_codes)
+            cls.color_codes.append(color_code)
+            cls.color_ids[color_code] = color_id
+        return color_id
+
+    def get_color_code(self, index):
+        return FaceData.color_codes[self.color_ids[index]]
+
+    def get_texmap(self, index):
+        texmap_id = self.texmap_ids[index]
+        if texmap_id < 0:
+            return None
+        return self.texmaps[texmap_id]
+
+    def get_pe_texmap(self, index):
+        pe_texmap_id = self.pe_texmap_ids[index]
+        if pe_texmap_id < 0:
+            return None
+        return self.pe_texmaps[pe_texmap_id]
+
+    # change color ids from the ones in color_codes to the ones of this process
+    # used for buffers that were built by another process
+    def remap_color_ids(self, color_codes):
+        if len(self) < 1:
+            return
+        color_ids = np.array([FaceData.get_color_id(color_code) for color_code in color_codes], dtype=np.int32)
+        color_ids = color_ids[np.frombuffer(self.color_ids, dtype=np.int32)]
+        self.color_ids = array.array("i", color_ids.tobytes())
+
+    def nbytes(self):
+        return sum(len(getattr(self, name)) * getattr(self, name).itemsize for name in FaceData.buffer_names)
+
+    # write the typed buffers to file and empty them
+    # texmaps and pe_texmaps are only references, so they stay in memory
+    # returns the length of each buffer, which restore needs to read them back
+    def spill(self, file):
+        lengths = []
+        for name in FaceData.buffer_names:
+            buffer = getattr(self, name)
+            lengths.append(len(buffer))
+            buffer.tofile(file)
+            setattr(self, name, array.array(buffer.typecode))
+        return lengths
+
+    def restore(self, file, lengths):
+        for name, length in zip(FaceData.buffer_names, lengths):
+            getattr(self, name).fromfile(file, length)
+
+    # a zero-copy (n, 3) view of vertices
+    # vertices can't be added to while the view exists
+    def get_vertices(self):
+        return np.frombuffer(memoryview(self.vertices), dtype=np.float32).reshape(-1, 3)
+
+    def add(self, vertices, color_code, texmap=None, pe_texmap=None):
+        self.offsets.append(len(self.vertices) // 3)
+        self.sizes.append(len(vertices))
+        self.vertices.frombytes(np.asarray(vertices, dtype=np.float32).tobytes())
+        self.color_ids.append(FaceData.get_color_id(color_code))
+        self.texmap_ids.append(self.__get_texmap_id(texmap))
+
+        pe_texmap_id = -1
+        if pe_texmap is not None:
+            pe_texmap_id = len(self.pe_texmaps)
+            self.pe_texmaps.append(pe_texmap)
+        self.pe_texmap_ids.append(pe_texmap_id)
+
+    # add every item of face_data transformed by matrix
+    # items with color code 16 take color_code and items without a texmap take texmap
+    def add_face_data(self, face_data, matrix, color_code, texmap=None):
+        if len(face_data) < 1:
+            return
+
+        vertices = matrices.transform_vertices(matrix, face_data.get_vertices())
+        vertex_offset = len(self.vertices) // 3
+        self.vertices.frombytes(np.asarray(vertices, dtype=np.float32).tobytes())
+        self.offsets.frombytes((np.frombuffer(face_data.offsets, dtype=np.int32) + vertex_offset).tobytes())
+        self.sizes.extend(face_data.sizes)
+
+        color_ids = np.frombuffer(face_data.color_ids, dtype=np.int32)
+        color_ids = np.where(color_ids == 0, FaceData.get_color_id(color_code), color_ids)
+        self.color_ids.frombytes(color_ids.astype(np.int32).tobytes())
+
+        # -1 indexes the last item, so items without a texmap get the id of texmap
+        texmap_ids = [self.__get_texmap_id(t) for t in face_data.texmaps] + [self.__get_texmap_id(texmap)]
+        texmap_ids = np.array(texmap_ids, dtype=np.int32)[np.frombuffer(face_data.texmap_ids, dtype=np.int32)]
+        self.texmap_ids.frombytes(texmap_ids.tobytes())
+
+        pe_texmap_ids = np.array([len(self.pe_texmaps) + i for i in range(len(face_data.pe_texmaps))] + [-1], dtype=np.int32)
+        pe_texmap_ids = pe_texmap_ids[np.frombuffer(face_data.pe_texmap_ids, dtype=np.int32)]
+        self.pe_texmap_ids.frombytes(pe_texmap_ids.tobytes())
+        self.pe_texmaps.extend(face_data.pe_texmaps)
+
+    # a copy of this with only the items where keep is True
+    def select(self, keep):
+        keep = np.asarray(keep, dtype=bool)
+        sizes = np.frombuffer(self.sizes, dtype=np.int32)
+        kept_sizes = sizes[keep]
+
+        face_data = FaceData()
+        face_data.vertices.frombytes(self.get_vertices()[np.repeat(keep, sizes)].tobytes())
+        face_data.offsets.frombytes((np.cumsum(kept_sizes, dtype=np.int32) - kept_sizes).tobytes())
+        face_data.sizes.frombytes(kept_sizes.tobytes())
+        for name in ["color_ids", "texmap_ids", "pe_texmap_ids"]:
+            getattr(face_data, name).frombytes(np.frombuffer(getattr(self, name), dtype=np.int32)[keep].tobytes())
+
+        # ids are kept as they are, so every texmap is kept even if none of its items are
+        face_data.texmaps = list(self.texmaps)
+        face_data.pe_texmaps = list(self.pe_texmaps)
+        face_data.__texmap_ids = dict(self.__texmap_ids)
+        return face_data
+
+    def __get_texmap_id(self, texmap):
+        if texmap is None:
+            return -1
+        texmap_id = self.__texmap_ids.get(texmap)
+        if texmap_id is None:
+            texmap_id = len(self.texmaps)
+            self.texmaps.append(texmap)
+            self.__texmap_ids[texmap] = texmap_id
+        return texmap_id
 
     # https://github.com/rredford/LdrawToObj/blob/802924fb8d42145c4f07c10824e3a7f2292a6717/LdrawData/LdrawToData.cs#L219
     # https://github.com/rredford/LdrawToObj/blob/802924fb8d42145c4f07c10824e3a7f2292a6717/LdrawData/LdrawToData.cs#L260
+    # vertices is every vertex of the file child_node is in, already transformed
+    # reversing the winding is just a different order of indices
     @staticmethod
-    def handle_vertex_winding(child_node, matrix, winding):
-        vert_count = len(child_node.vertices)
-
+    def handle_vertex_winding(child_node, vertices, winding):
         # matrix = matrix @ matrices.gap_scale_matrix
 
-        vertices = []
+        vertex_order = child_node.vertex_order
         if winding == "CW":
-            if vert_count == 3:
-                vertices = [
-                    matrix @ child_node.vertices[0],
-                    matrix @ child_node.vertices[2],
-                    matrix @ child_node.vertices[1],
-                ]
-            elif vert_count == 4:
-                vertices = [
-                    matrix @ child_node.vertices[0],
-                    matrix @ child_node.vertices[3],
-                    matrix @ child_node.vertices[2],
-                    matrix @ child_node.vertices[1],
-                ]
-                FaceData.__fix_bowties(vertices)
-        else:  # winding == "CCW" or winding is None:
-            if vert_count == 3:
-                vertices = [
-                    matrix @ child_node.vertices[0],
-                    matrix @ child_node.vertices[1],
-                    matrix @ child_node.vertices[2],
-                ]
-            elif vert_count == 4:
-                vertices = [
-                    matrix @ child_node.vertices[0],
-                    matrix @ child_node.vertices[1],
-                    matrix @ child_node.vertices[2],
-                    matrix @ child_node.vertices[3],
-                ]
-                FaceData.__fix_bowties(vertices)
-
-        return vertices
+            vertex_order = vertex_order[FaceData.__reverse_winding[len(vertex_order)]]
+        # else winding == "CCW" or winding is None:
+
+        return vertices[child_node.vertex_index + vertex_order]
+
+    __reverse_winding = {
+        3: np.array((0, 2, 1)),
+        4: np.array((0, 3, 2, 1)),
+    }
 
     # handle bowtie quadrilaterals - 6582.dat
     # https://github.com/TobyLobster/ImportLDraw/pull/65/commits/3d8cebee74bf6d0447b616660cc989e870f00085
+    # quads is an (n, 4, 3) array of the vertices of every quad in a file
+    # returns an (n, 4) array of the order the vertices of each quad should be used in
+    # this is done once in the file's local space since a transform doesn't turn a planar quad into a bowtie
     @staticmethod
-    def __fix_bowties(vertices):
-        nA = (vertices[1] - vertices[0]).cross(vertices[2] - vertices[0])
-        nB = (vertices[2] - vertices[1]).cross(vertices[3] - vertices[1])
-        nC = (vertices[3] - vertices[2]).cross(vertices[0] - vertices[2])
-        if nA.dot(nB) < 0:
-            vertices[2], vertices[3] = vertices[3], vertices[2]
-        elif nB.dot(nC) < 0:
-            vertices[2], vertices[1] = vertices[1], vertices[2]
+    def fix_bowties(quads):
+        v0, v1, v2, v3 = quads[:, 0], quads[:, 1], quads[:, 2], quads[:, 3]
+        nA = np.cross(v1 - v0, v2 - v0)
+        nB = np.cross(v2 - v1, v3 - v1)
+        nC = np.cross(v3 - v2, v0 - v2)
+        swap_23 = np.einsum('ij,ij->i', nA, nB) < 0
+        swap_12 = ~swap_23 & (np.einsum('ij,ij->i', nB, nC) < 0)
+
+        vertex_orders = np.tile(np.arange(4), (len(quads), 1))
+        vertex_orders[swap_23] = (0, 1, 3, 2)
+        vertex_orders[swap_12] = (0, 2, 1, 3)
+        return vertex_orders
 
 
 class GeometryData:
@@ -73,26 +209,94 @@ class GeometryData:
         self.key = None
         self.file = None
         self.bfc_certified = None
-        self.edge_data = []
-        self.face_data = []
-        self.line_data = []
+        self.edge_data = FaceData()
+        self.face_data = FaceData()
+        self.line_data = FaceData()
+        # where the buffers are while they are spilled to disk, see geometry_spill
+        self.spill_path = None
+        self.spill_lengths = None
+        self.bounds = None
+
+    def nbytes(self):
+        return self.face_data.nbytes() + self.edge_data.nbytes() + self.line_data.nbytes()
+
+    # the axis aligned bounding box of the faces and edges as a (2, 3) array of min and max
+    # None if there is no geometry
+    # it's computed once the geometry is complete and kept even if the buffers are spilled
+    def get_bounds(self):
+        if self.bounds is None:
+            self.restore()
+            vertices = [face_data.get_vertices() for face_data in [self.face_data, self.edge_data] if len(face_data) > 0]
+            if len(vertices) > 0:
+                vertices = np.concatenate(vertices)
+                self.bounds = np.array([vertices.min(axis=0), vertices.max(axis=0)], dtype=np.float64)
+        return self.bounds
+
+    # a digest of the faces, edges and lines and their colors
+    # None if any of them are texmapped since texmaps can't be compared by value
+    def content_hash(self):
+        face_datas = [self.face_data, self.edge_data, self.line_data]
+        if any(len(face_data.texmaps) > 0 or len(face_data.pe_texmaps) > 0 for face_data in face_datas):
+            return None
+
+        self.restore()
+        digest = hashlib.blake2b(digest_size=16)
+        for face_data in face_datas:
+            for name in ["vertices", "sizes", "color_ids"]:
+                buffer = getattr(face_data, name)
+                digest.update(len(buffer).to_bytes(8, "little"))
+                digest.update(buffer.tobytes())
+        return digest.hexdigest()
+
+    # move the buffers to a file at filepath until they are restored
+    def spill(self, filepath):
+        with open(filepath, "wb") as file:
+            self.spill_lengths = [
+                self.face_data.spill(file),
+                self.edge_data.spill(file),
+                self.line_data.spill(file),
+            ]
+        self.spill_path = filepath
+
+    # read the buffers back if they were spilled, must be called before they are used
+    # the methods of geometry_data that read the buffers call it themselves
+    def restore(self):
+        if self.spill_path is None:
+            return
+
+        with open(self.spill_path, "rb") as file:
+            self.face_data.restore(file, self.spill_lengths[0])
+            self.edge_data.restore(file, self.spill_lengths[1])
+            self.line_data.restore(file, self.spill_lengths[2])
+        os.remove(self.spill_path)
+        self.spill_path = None
+        self.spill_lengths = None
 
     def add_edge_data(self, vertices, color_code):
-        self.edge_data.append(FaceData(
+        self.edge_data.add(
             vertices=vertices,
             color_code=color_code,
-        ))
+        )
 
     def add_face_data(self, vertices, color_code, texmap=None, pe_texmap=None):
-        self.face_data.append(FaceData(
+        self.face_data.add(
             vertices=vertices,
             color_code=color_code,
             texmap=texmap,
             pe_texmap=pe_texmap,
-        ))
+        )
 
     def add_line_data(self, vertices, color_code):
-        self.line_data.append(FaceData(
+        self.line_data.add(
             vertices=vertices,
             color_code=color_code,
-        ))
+        )
+
+    # add the geometry of another geometry_data transformed by matrix
+    # faces and edges with color code 16 take color_code
+    # each of faces, edges and lines is transformed with one multiply
+    def add_geometry_data(self, geometry_data, matrix, color_code, texmap=None):
+        geometry_data.restore()
+        self.face_data.add_face_data(geometry_data.face_data, matrix, color_code, texmap=texmap)
+        self.edge_data.add_face_data(geometry_data.edge_data, matrix, color_code)
+        self.line_data.add_face_data(geometry_data.line_data, matrix, color_code)
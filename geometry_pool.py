@@ -0,0 +1,53 @@
+import multiprocessing
+import os
+from sys import platform
+
+from .geometry_data import FaceData, GeometryData
+from .import_options import ImportOptions
+from .ldraw_file import LDrawFile
+from .ldraw_node import LDrawNode
+
+
+# build the geometry of every unique part under ldraw_node in worker processes before it is loaded
+# load then finds the geometry already built and only creates meshes and objects
+# workers are forked so they already have every parsed file and the import options
+# they only walk parsed files and return typed buffers, they never touch bpy
+# only on linux, fork isn't available on windows and forking blender isn't safe on macos, so parts are built as they're loaded there
+# yields how many of the parts have been built from 0 to 1 as they come back
+def build_geometry_datas(ldraw_node):
+    if not ImportOptions.parallel_parts:
+        return
+
+    if not __is_available():
+        return
+
+    part_files = LDrawNode.collect_part_files(ldraw_node)
+    if len(part_files) < 2:
+        return
+
+    processes = min(len(part_files), os.cpu_count() or 1)
+    chunksize = max(1, len(part_files) // (processes * 4))
+    filenames = [part_file.filename for part_file in part_files]
+
+    context = multiprocessing.get_context("fork")
+    with context.Pool(processes=processes) as pool:
+        for i, (part_file, buffers) in enumerate(zip(part_files, pool.imap(__build_buffers, filenames, chunksize=chunksize))):
+            geometry_data = GeometryData()
+            geometry_data.face_data, geometry_data.edge_data, geometry_data.line_data, geometry_data.bfc_certified, color_codes = buffers
+
+            # color ids are only the same within a process
+            geometry_data.face_data.remap_color_ids(color_codes)
+            geometry_data.edge_data.remap_color_ids(color_codes)
+            geometry_data.line_data.remap_color_ids(color_codes)
+
+            LDrawNode.add_geometry_data(part_file, geometry_data)
+            yield (i + 1) / len(part_files)
+
+
+def __is_available():
+    return (platform == "linux" or platform == "linux2") and "fork" in multiprocessing.get_all_start_methods()
+
+
+def __build_buffers(filename):
+    geometry_data = LDrawNode.build_geometry_data(LDrawFile.get_file(filename))
+    return geometry_data.face_data, geometry_data.edge_data, geometry_data.line_data, geometry_data.bfc_certified, FaceData.color_codes
@@ -0,0 +1,55 @@
+import os
+import tempfile
+from collections import OrderedDict
+
+from .import_options import ImportOptions
+
+# geometry_data.key: geometry_data
+# geometry_datas whose meshes have been built, oldest first
+# their buffers are only read again if a mesh has to be rebuilt, like when the mesh it would be copied from is gone,
+# so once they take more than ImportOptions.geometry_memory_limit, the oldest are written to disk
+released_geometry_datas = OrderedDict()
+released_bytes = 0
+spill_count = 0
+spill_directory = None
+
+
+def reset_caches():
+    global released_bytes
+    global spill_count
+    global spill_directory
+
+    released_geometry_datas.clear()
+    released_bytes = 0
+    spill_count = 0
+    if spill_directory is not None:
+        spill_directory.cleanup()
+    spill_directory = None
+
+
+# called once the meshes of geometry_data exist
+def release(geometry_data):
+    global released_bytes
+
+    if geometry_data.spill_path is not None or geometry_data.key in released_geometry_datas:
+        return
+
+    released_geometry_datas[geometry_data.key] = geometry_data
+    released_bytes += geometry_data.nbytes()
+
+    limit = ImportOptions.geometry_memory_limit * 1024 * 1024
+    while released_bytes > limit and len(released_geometry_datas) > 0:
+        key, spilled_geometry_data = released_geometry_datas.popitem(last=False)
+        released_bytes -= spilled_geometry_data.nbytes()
+        __spill(spilled_geometry_data)
+
+
+def __spill(geometry_data):
+    global spill_count
+    global spill_directory
+
+    if spill_directory is None:
+        spill_directory = tempfile.TemporaryDirectory(prefix="ldraw_geometry_")
+
+    spill_count += 1
+    geometry_data.spill(os.path.join(spill_directory.name, f"{spill_count}.bin"))
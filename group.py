@@ -1,4 +1,3 @@
-import bpy
 import os
 from . import helpers
 from .import_options import ImportOptions
@@ -82,10 +81,14 @@ def groups_setup(top_collection_name):
 
 
 def get_scene_collection():
+    import bpy
+
     return bpy.context.scene.collection
 
 
 def get_collection(collection_name, host_collection):
+    import bpy
+
     collection_name = collection_name[:63]
     collection = bpy.data.collections.get(collection_name)
     if collection is None:
@@ -96,6 +99,8 @@ def get_collection(collection_name, host_collection):
 
 
 def get_filename_collection(collection_name, host_collection=None):
+    import bpy
+
     collection_name = os.path.basename(collection_name)
     collection = bpy.data.collections.new(collection_name)
     if host_collection is None:
@@ -29,6 +29,13 @@ class ImportOptions:
     defaults["meta_step_groups"] = False
     meta_step_groups = defaults["meta_step_groups"]
 
+    # only the parts of steps first_step to last_step are imported, 0 is the last step
+    defaults["first_step"] = 1
+    first_step = defaults["first_step"]
+
+    defaults["last_step"] = 0
+    last_step = defaults["last_step"]
+
     defaults["meta_clear"] = False
     meta_clear = defaults["meta_clear"]
 
@@ -94,6 +101,15 @@ class ImportOptions:
     defaults["import_edges"] = False
     import_edges = defaults["import_edges"]
 
+    # line type 2 edges are only used for edge meshes and to find sharp edges
+    # line type 5 conditional lines aren't used by anything
+    @staticmethod
+    def use_edges():
+        return (ImportOptions.import_edges or
+                ImportOptions.bevel_edges or
+                ImportOptions.use_freestyle_edges or
+                ImportOptions.smooth_type_value() in ["edge_split", "bmesh_split"])
+
     defaults["bevel_edges"] = False
     bevel_edges = defaults["bevel_edges"]
 
@@ -118,6 +134,50 @@ class ImportOptions:
     defaults["treat_shortcut_as_model"] = False  # TODO: if true parent to empty at median of group
     treat_shortcut_as_model = defaults["treat_shortcut_as_model"]
 
+    # only import parts that culling_camera can see, the first camera if it's empty
+    defaults["camera_culling"] = False
+    camera_culling = defaults["camera_culling"]
+
+    defaults["culling_camera"] = ""
+    culling_camera = defaults["culling_camera"]
+
+    # circular primitives are generated instead of read from the library, see primitives
+    defaults["procedural_primitives"] = False
+    procedural_primitives = defaults["procedural_primitives"]
+
+    # the segments of a whole circle of a standard resolution procedural primitive
+    defaults["primitive_segments"] = 16
+    primitive_segments = defaults["primitive_segments"]
+
+    # each part's primitives are the resolution that fits its size, see part_lod
+    defaults["part_lod"] = False
+    part_lod = defaults["part_lod"]
+
+    # in LDU
+    defaults["lod_low_size"] = 40.0
+    lod_low_size = defaults["lod_low_size"]
+
+    defaults["lod_high_size"] = 400.0
+    lod_high_size = defaults["lod_high_size"]
+
+    # parts that are inside of the model with no way to see them from outside aren't imported
+    defaults["occlusion_culling"] = False
+    occlusion_culling = defaults["occlusion_culling"]
+
+    # studs with another part on top of them aren't imported
+    defaults["hide_covered_studs"] = False
+    hide_covered_studs = defaults["hide_covered_studs"]
+
+    defaults["share_identical_parts"] = False
+    share_identical_parts = defaults["share_identical_parts"]
+
+    defaults["parallel_parts"] = False
+    parallel_parts = defaults["parallel_parts"]
+
+    # in megabytes
+    defaults["geometry_memory_limit"] = 256
+    geometry_memory_limit = defaults["geometry_memory_limit"]
+
     scale_strategy_choices = (
         ("mesh", "Scale mesh", "Apply import scaling to mesh. Recommended for rendering"),
         ("object", "Scale object", "Apply import scaling to object. Recommended for part editing"),
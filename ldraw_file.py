@@ -1,5 +1,7 @@
 import mathutils
+import numpy as np
 
+import hashlib
 import os
 import re
 import zipfile
@@ -7,10 +9,12 @@ import zipfile
 from .import_options import ImportOptions
 from .filesystem import FileSystem
 from .ldraw_node import LDrawNode
+from .geometry_data import FaceData
 from .ldraw_color import LDrawColor
 from . import base64_handler
 from . import helpers
 from . import ldraw_part_types
+from . import primitives
 from . import texmap
 
 
@@ -22,15 +26,62 @@ class LDrawFile:
     __unparsed_file_cache = {}
     __parsed_file_cache = {}
 
+    # parsed files from previous imports, keyed by where they came from
+    # not cleared by reset_caches so that re-importing a file only re-parses the mpd files that changed
+    # only the files used by the last import are kept, see reset_caches
+    __content_cache = {}
+    # primitives made by primitives, kept like __content_cache so that files reused from it still have the same subfiles
+    __primitive_file_cache = {}
+    # the keys of __content_cache and __primitive_file_cache used since the last reset_caches
+    __used_content_keys = set()
+    __used_primitive_keys = set()
+
     @classmethod
     def reset_caches(cls):
         cls.__unparsed_file_cache.clear()
         cls.__parsed_file_cache.clear()
+        cls.__prune_content_cache()
+
+    # drop the files that weren't used by the last import so that files that were edited or are no longer imported don't pile up
+    @classmethod
+    def __prune_content_cache(cls):
+        for key in set(cls.__content_cache) - cls.__used_content_keys:
+            del cls.__content_cache[key]
+        for key in set(cls.__primitive_file_cache) - cls.__used_primitive_keys:
+            del cls.__primitive_file_cache[key]
+        cls.__used_content_keys.clear()
+        cls.__used_primitive_keys.clear()
+
+    @classmethod
+    def reset_content_cache(cls):
+        cls.__content_cache.clear()
+        cls.__primitive_file_cache.clear()
+        cls.__used_content_keys.clear()
+        cls.__used_primitive_keys.clear()
 
     def __init__(self, filename):
         self.filename = filename
         self.lines = []
 
+        # where this file's lines are on disk
+        # source_ranges is a list of [start, end] byte offsets, None means the whole file
+        self.source_path = None
+        self.source_member = None
+        self.source_ranges = None
+        self.streamed = False
+
+        # hash of this file's lines, used to tell if a file has changed since the last import
+        self.content_hash = None
+        self.content_options = None
+        # every file referenced by a line type 1, so reused files can be checked for changed subfiles
+        self.subfiles = {}
+        # what this file's nodes are, recorded while it's parsed so that streamed files don't have to be parsed again to find out
+        # every meta_command of its nodes, and ldraw_file: how many line type 1 nodes use it
+        self.meta_commands = set()
+        self.subfile_counts = {}
+        # the primitive resolution this file's subfiles are located with, None for the resolution of the search paths
+        self.resolution = None
+
         self.description = None
         self.name = os.path.basename(filename)
         self.author = None
@@ -50,6 +101,10 @@ class LDrawFile:
 
         self.child_nodes = []
         self.geometry_commands = {}
+        # the vertices of every geometry line of this file, see __pack_vertices
+        self.vertices = None
+        # the uvs of every triangle that has them, see __pack_vertices
+        self.uvs = None
 
         self.named = False
 
@@ -92,39 +147,259 @@ class LDrawFile:
 
         return ldraw_file
 
+    # resolution is one of the values of FileSystem.resolution_choices to get the file with the primitives of that resolution
     @classmethod
-    def get_file(cls, filename):
-        ldraw_file = cls.__parsed_file_cache.get(filename)
-        if ldraw_file is not None:
-            return ldraw_file
+    def get_file(cls, filename, resolution=None):
+        if resolution is not None:
+            return cls.__get_resolution_file(filename, resolution)
+
+        # files that could not be found are cached as None so they are only searched for once
+        if filename in cls.__parsed_file_cache:
+            return cls.__parsed_file_cache[filename]
 
         ldraw_file = cls.__unparsed_file_cache.get(filename)
+        if ldraw_file is None and primitives.is_used() and primitives.is_primitive(filename):
+            ldraw_file = cls.__get_primitive_file(filename)
+            cls.__parsed_file_cache[filename] = ldraw_file
+            return ldraw_file
+
         if ldraw_file is None:
             ldraw_file = cls.__load_file(filename)
 
         if ldraw_file is None:
+            cls.__parsed_file_cache[filename] = ldraw_file
             return ldraw_file
 
+        cached_file = cls.__get_unchanged_file(ldraw_file)
+        if cached_file is not None:
+            # the file hasn't changed, but where its lines are in the mpd might have
+            cached_file.source_ranges = ldraw_file.source_ranges
+            cls.__parsed_file_cache[filename] = cached_file
+            cls.__used_content_keys.add(cached_file.__content_key())
+            return cached_file
+
         ldraw_file.__parse_file()
+        ldraw_file.content_options = cls.__content_options()
         cls.__parsed_file_cache[filename] = ldraw_file
+        if ldraw_file.content_hash is not None and not ldraw_file.is_configuration():
+            cls.__content_cache[ldraw_file.__content_key()] = ldraw_file
+            cls.__used_content_keys.add(ldraw_file.__content_key())
         return ldraw_file
 
+    # parse filename and every file it references one file at a time, subfiles before the files that use them,
+    # so that each step is one file instead of get_file parsing the whole tree at once
+    # get_file(filename) afterwards only returns what was parsed here
+    # yields how many of the files found so far have been parsed from 0 to 1
+    @classmethod
+    def iter_parse(cls, filename):
+        found = {filename}
+        # filename and the names of its subfiles, or None if it hasn't been scanned yet
+        stack = [(filename, None)]
+        parsed_count = 0
+        while len(stack) > 0:
+            _filename, subfile_names = stack[-1]
+            if subfile_names is None:
+                subfile_names = cls.__scan_subfile_names(_filename)
+                stack[-1] = (_filename, subfile_names)
+                for subfile_name in subfile_names:
+                    if subfile_name not in found:
+                        found.add(subfile_name)
+                        stack.append((subfile_name, None))
+                continue
+
+            stack.pop()
+            cls.get_file(_filename)
+            parsed_count += 1
+            yield parsed_count / len(found)
+
+    # the names of the files that the line type 1 lines of filename reference, without parsing it
+    # a file that is unchanged since the last import has the subfiles it had then
+    @classmethod
+    def __scan_subfile_names(cls, filename):
+        if filename in cls.__parsed_file_cache:
+            return []
+
+        ldraw_file = cls.__unparsed_file_cache.get(filename)
+        if ldraw_file is None and primitives.is_used() and primitives.is_primitive(filename):
+            return []
+
+        if ldraw_file is None:
+            ldraw_file = cls.__load_file(filename)
+            if ldraw_file is None:
+                return []
+            # the first file of an mpd is cached under its own name, so it's kept under filename too so the mpd isn't read again
+            cls.__unparsed_file_cache.setdefault(filename, ldraw_file)
+
+        cached_file = cls.__content_cache.get(ldraw_file.__content_key())
+        if cached_file is not None and cached_file.content_hash == ldraw_file.content_hash:
+            return list(cached_file.subfiles)
+
+        subfile_names = []
+        for clean_line, strip_line in cls.__tokenize(ldraw_file.read_lines()):
+            if clean_line.startswith("1 "):
+                _sparams = strip_line.split(maxsplit=14)
+                if len(_sparams) > 14:
+                    subfile_names.append(LDrawFile.__subfile_name(_sparams))
+        return subfile_names
+
+    # a file parsed during a previous import can be reused if its lines are the same, it was parsed with the same options,
+    # and every file it references is also unchanged
+    # configuration files are always parsed since parsing them is what loads the colors
+    @classmethod
+    def __get_unchanged_file(cls, ldraw_file):
+        cached_file = cls.__content_cache.get(ldraw_file.__content_key())
+        if cached_file is None:
+            return None
+
+        if cached_file.content_hash != ldraw_file.content_hash:
+            return None
+
+        if cached_file.content_options != cls.__content_options():
+            return None
+
+        # keep the old file in the parsed cache while its subfiles are checked in case it references itself
+        cls.__parsed_file_cache[ldraw_file.filename] = cached_file
+        for subfile_name, subfile in cached_file.subfiles.items():
+            if LDrawFile.get_file(subfile_name) is not subfile:
+                del cls.__parsed_file_cache[ldraw_file.filename]
+                return None
+
+        return cached_file
+
+    # a file is only parsed again for resolution if it or any of its subfiles are different with it
+    # otherwise the file is shared with the one of the search paths' resolution
+    # parsed again files aren't kept between imports
+    @classmethod
+    def __get_resolution_file(cls, filename, resolution):
+        key = (filename, resolution)
+        if key in cls.__parsed_file_cache:
+            return cls.__parsed_file_cache[key]
+
+        if filename not in cls.__unparsed_file_cache and primitives.is_used() and primitives.is_primitive(filename):
+            resolution_file = cls.__get_primitive_file(filename, resolution=resolution)
+            cls.__parsed_file_cache[key] = resolution_file
+            return resolution_file
+
+        ldraw_file = cls.get_file(filename)
+        if ldraw_file is None:
+            return ldraw_file
+
+        # the files of an mpd are where they are no matter the resolution
+        filepath = ldraw_file.source_path
+        if ldraw_file.source_ranges is None and ldraw_file.source_path is not None:
+            filepath = FileSystem.locate(filename, resolution=resolution)
+
+        # keep the file in the parsed cache while its subfiles are checked in case it references itself
+        cls.__parsed_file_cache[key] = ldraw_file
+        if filepath == ldraw_file.source_path and all(LDrawFile.get_file(subfile_name, resolution=resolution) is subfile for subfile_name, subfile in ldraw_file.subfiles.items()):
+            return ldraw_file
+
+        resolution_file = cls.__new_source_file(filename, filepath, ldraw_file.source_member if filepath == ldraw_file.source_path else None)
+        if filepath == ldraw_file.source_path:
+            resolution_file.source_ranges = ldraw_file.source_ranges
+        resolution_file.resolution = resolution
+        resolution_file.__parse_file()
+        cls.__parsed_file_cache[key] = resolution_file
+        return resolution_file
+
+    @classmethod
+    def __get_primitive_file(cls, filename, resolution=None):
+        key = (filename, resolution, primitives.get_segments(filename, resolution), ImportOptions.use_edges())
+        ldraw_file = cls.__primitive_file_cache.get(key)
+        if ldraw_file is None:
+            ldraw_file = cls.__new_primitive_file(filename, resolution)
+            cls.__primitive_file_cache[key] = ldraw_file
+        cls.__used_primitive_keys.add(key)
+        return ldraw_file
+
+    # a primitive made by primitives instead of read from its file
+    # its nodes are made straight from the generated arrays without any lines to parse
+    @classmethod
+    def __new_primitive_file(cls, filename, resolution):
+        ldraw_file = LDrawFile(filename)
+        ldraw_file.resolution = resolution
+        ldraw_file.description = "Procedural primitive"
+        ldraw_file.actual_part_type = "Primitive"
+        ldraw_file.part_type = "primitive"
+
+        bfc_node = LDrawNode()
+        bfc_node.line = "0 BFC CERTIFY CCW"
+        bfc_node.meta_command = "bfc"
+        bfc_node.meta_args["command"] = "CERTIFY CCW"
+        ldraw_file.__record_node(bfc_node)
+        ldraw_file.child_nodes.append(bfc_node)
+
+        unused_line_types = LDrawFile.__unused_line_types()
+        for line_type, color_code, vertices in primitives.get_lines(filename, primitives.get_segments(filename, resolution)):
+            if f"{line_type} " in unused_line_types:
+                ldraw_file.geometry_commands[line_type] = ldraw_file.geometry_commands.get(line_type, 0) + len(vertices)
+                continue
+
+            for _vertices in vertices:
+                ldraw_node = LDrawNode()
+                ldraw_node.meta_command = line_type
+                ldraw_node.color_code = color_code
+                ldraw_node.vertices = _vertices
+                ldraw_file.__record_node(ldraw_node)
+                ldraw_file.child_nodes.append(ldraw_node)
+
+        ldraw_file.__pack_vertices()
+        return ldraw_file
+
+    def __content_key(self):
+        return self.source_path, self.source_member, self.filename
+
+    # options that change how a file is parsed
+    @staticmethod
+    def __content_options():
+        return (
+            ImportOptions.meta_texmap,
+            ImportOptions.display_logo,
+            ImportOptions.chosen_logo,
+            ImportOptions.treat_shortcut_as_model,
+            ImportOptions.use_edges(),
+        )
+
     @classmethod
     def __load_file(cls, filename):
         filepath = FileSystem.locate(filename)
         if filepath is None:
             return None
 
-        if filename.endswith('.io') and zipfile.is_zipfile(filename):
-            with zipfile.ZipFile(filename, 'r') as zip:
-                model_ldr = zip.read('model.ldr').decode('utf-8-sig')
-                return cls.__read_file(model_ldr.splitlines(), filename)
+        if filename.endswith('.io') and zipfile.is_zipfile(filepath):
+            return cls.__read_file(filepath, filename, member='model.ldr')
+
+        return cls.__read_file(filepath, filename)
 
-        with open(filepath, 'r', encoding='utf-8') as file:
-            return cls.__read_file(file, filename)
+    # yields (offset, next_offset, line) for every line in ranges
+    # lines are read from disk one at a time so that the size of the file doesn't matter
+    @classmethod
+    def __stream_source(cls, filepath, member=None, ranges=None):
+        if member is not None:
+            with zipfile.ZipFile(filepath, 'r') as zip:
+                with zip.open(member) as file:
+                    yield from cls.__stream_ranges(file, ranges)
+        else:
+            with open(filepath, 'rb') as file:
+                yield from cls.__stream_ranges(file, ranges)
 
+    @staticmethod
+    def __stream_ranges(file, ranges):
+        for start, end in ranges or [(0, None)]:
+            file.seek(start)
+            offset = start
+            for raw_line in file:
+                if end is not None and offset >= end:
+                    break
+                next_offset = offset + len(raw_line)
+                encoding = 'utf-8-sig' if offset == 0 else 'utf-8'
+                yield offset, next_offset, raw_line.decode(encoding)
+                offset = next_offset
+
+    # the file is scanned once to find where each mpd file starts and ends and to load !DATA blocks
+    # lines are not kept, each LDrawFile just remembers where in the file its lines are
     @classmethod
-    def __read_file(cls, file, filename):
+    def __read_file(cls, filepath, filename, member=None):
         hit_not_blank_line = False
         is_mpd = None
         no_file = False
@@ -133,12 +408,17 @@ class LDrawFile:
         current_mpd_file = None
         current_data_filename = None
         current_data = None
+        file_hash = hashlib.sha1()
 
-        for line in file:
+        for offset, next_offset, line in cls.__stream_source(filepath, member):
+            file_hash.update(line.encode())
             clean_line = helpers.clean_line(line)
             strip_line = line.strip()
 
             if clean_line == "":
+                # keep blank lines in the current range so that ranges aren't split up by them
+                if current_data_filename is None and current_mpd_file is not None and not no_file:
+                    current_mpd_file.__extend_source_range(offset, next_offset, line)
                 continue
 
             # if we're working on a data block, keep adding to it
@@ -171,15 +451,11 @@ class LDrawFile:
 
             hit_not_blank_line = True
 
-            # clean up texmap geometry line prefixes
-            if ImportOptions.meta_texmap:
-                line = texmap.clean_line(line)
-
             # not mpd -> regular ldr/dat file
+            # the whole file belongs to current_file, so there are no ranges to keep track of
             if not is_mpd:
                 if current_file is None:
-                    current_file = LDrawFile(filename)
-                current_file.lines.append(line)
+                    current_file = cls.__new_source_file(filename, filepath, member)
                 continue
 
             if is_mpd_line:
@@ -191,14 +467,16 @@ class LDrawFile:
                     first_mpd_filename = mpd_filename
 
                 if current_mpd_file is not None:
-                    cls.__unparsed_file_cache[current_mpd_file.filename] = current_mpd_file
-                current_mpd_file = LDrawFile(mpd_filename)
+                    cls.__cache_unparsed_file(current_mpd_file)
+                current_mpd_file = cls.__new_source_file(mpd_filename, filepath, member)
+                current_mpd_file.source_ranges = []
+                current_mpd_file.content_hash = hashlib.sha1()
                 continue
 
             if is_nofile_line:
                 no_file = True
                 if current_mpd_file is not None:
-                    cls.__unparsed_file_cache[current_mpd_file.filename] = current_mpd_file
+                    cls.__cache_unparsed_file(current_mpd_file)
                 current_mpd_file = None
                 continue
 
@@ -211,7 +489,7 @@ class LDrawFile:
                 continue
 
             if current_mpd_file is not None:
-                current_mpd_file.lines.append(line)
+                current_mpd_file.__extend_source_range(offset, next_offset, line)
                 continue
 
         if current_data_filename is not None:
@@ -221,53 +499,201 @@ class LDrawFile:
 
         # last file in mpd will not be added to the file cache if it doesn't end in 0 NOFILE
         if current_mpd_file is not None:
-            cls.__unparsed_file_cache[current_mpd_file.filename] = current_mpd_file
+            cls.__cache_unparsed_file(current_mpd_file)
 
         if current_file is not None:
-            cls.__unparsed_file_cache[current_file.filename] = current_file
+            current_file.content_hash = file_hash
+            cls.__cache_unparsed_file(current_file)
 
         if first_mpd_filename is not None:
             filename = first_mpd_filename
 
         return cls.__unparsed_file_cache.get(filename)
 
+    @classmethod
+    def __new_source_file(cls, filename, filepath, member):
+        ldraw_file = LDrawFile(filename)
+        ldraw_file.source_path = filepath
+        ldraw_file.source_member = member
+        return ldraw_file
+
+    @classmethod
+    def __cache_unparsed_file(cls, ldraw_file):
+        ldraw_file.content_hash = ldraw_file.content_hash.hexdigest()
+        cls.__unparsed_file_cache[ldraw_file.filename] = ldraw_file
+
+    def __extend_source_range(self, offset, next_offset, line):
+        self.content_hash.update(line.encode())
+        if len(self.source_ranges) > 0 and self.source_ranges[-1][1] == offset:
+            self.source_ranges[-1][1] = next_offset
+        else:
+            self.source_ranges.append([offset, next_offset])
+
+    # lines of files that were read from disk are streamed from disk again every time they are requested
+    # files created in memory, like when exporting, use self.lines
+    def read_lines(self):
+        if self.source_path is None:
+            yield from self.lines
+            return
+
+        for offset, next_offset, line in LDrawFile.__stream_source(self.source_path, self.source_member, self.source_ranges):
+            yield line
+
+    # models are streamed every time they are traversed instead of keeping their nodes in memory
+    # parts, subparts and primitives keep their nodes since they are reused so often
+    def iter_child_nodes(self):
+        if self.streamed:
+            return self.__parse_nodes()
+        return self.child_nodes
+
+    # read -> tokenize -> node stream
+    # header lines and geometry counts are collected during this first pass
+    # the nodes of a model are dropped as soon as they are created, only part-like files keep theirs
+    # whether a file is a model is decided at its first line type 1 to 5, since by then its header has been read,
+    # or for a file without a header, that line is geometry if it's a part, so parts without a header aren't parsed twice
+    # there are occasions where files with part_type of model have geometry after that, so their nodes have to be kept after all
+    # example: 10252 - 10252_towel.dat in 10252-1 - Volkswagen Beetle.mpd
+    def __parse_file(self):
+        keep_nodes = None
+        dropped_nodes = False
+        for ldraw_node in self.__parse_nodes(header=True):
+            self.__record_node(ldraw_node)
+            if keep_nodes is None and ldraw_node.meta_command in ["1", "2", "3", "4", "5"]:
+                keep_nodes = self.is_like_part() or not self.is_like_model()
+                if not keep_nodes:
+                    dropped_nodes = len(self.child_nodes) > 0
+                    self.child_nodes = []
+
+            if keep_nodes is False:
+                dropped_nodes = True
+                continue
+            self.child_nodes.append(ldraw_node)
+
+        self.streamed = self.is_like_model() and not self.is_like_part()
+        if self.streamed:
+            self.child_nodes = []
+        elif dropped_nodes:
+            self.child_nodes = list(self.__parse_nodes())
+
+        if not self.streamed:
+            self.__pack_vertices()
+
+    # put the vertices of every line type 2, 3, 4 and 5 of this file into one array
+    # so that they can all be transformed with one multiply
+    # each node keeps where its vertices start and the order they should be used in
+    def __pack_vertices(self):
+        geometry_nodes = [n for n in self.child_nodes if n.meta_command in ["2", "3", "4", "5"]]
+        if len(geometry_nodes) < 1:
+            return
+
+        self.vertices = np.concatenate([n.vertices for n in geometry_nodes])
+
+        vertex_index = 0
+        for ldraw_node in geometry_nodes:
+            vertex_count = len(ldraw_node.vertices)
+            ldraw_node.vertex_index = vertex_index
+            ldraw_node.vertex_order = np.arange(vertex_count)
+            ldraw_node.vertices = self.vertices[vertex_index:vertex_index + vertex_count]
+            vertex_index += vertex_count
+
+        quad_nodes = [n for n in geometry_nodes if n.meta_command == "4"]
+        if len(quad_nodes) > 0:
+            quads = np.array([n.vertices for n in quad_nodes])
+            for ldraw_node, vertex_order in zip(quad_nodes, FaceData.fix_bowties(quads)):
+                ldraw_node.vertex_order = vertex_order
+
+        uv_nodes = [n for n in geometry_nodes if n.uvs is not None]
+        if len(uv_nodes) > 0:
+            self.uvs = np.concatenate([n.uvs for n in uv_nodes])
+            for i, ldraw_node in enumerate(uv_nodes):
+                ldraw_node.uvs = self.uvs[i * 3:i * 3 + 3]
+
+    @staticmethod
+    def __tokenize(lines):
+        for line in lines:
+            # clean up texmap geometry line prefixes
+            if ImportOptions.meta_texmap:
+                line = texmap.clean_line(line)
+
+            clean_line = helpers.clean_line(line)
+            if clean_line == "":
+                continue
+
+            yield clean_line, line.strip()
+
     # create meta nodes when those commands affect the scene
     # process meta command in place if it only affects the file
-    def __parse_file(self):
-        for line in self.lines:
+    # geometry lines that aren't used with the current options are only counted
+    # so they are never turned into nodes, stored or transformed
+    def __parse_nodes(self, header=False):
+        unused_line_types = LDrawFile.__unused_line_types()
+        for clean_line, strip_line in self.__tokenize(self.read_lines()):
+            if clean_line[:2] in unused_line_types:
+                if header:
+                    self.__count_line_type(clean_line[0])
+                continue
+
             try:
-                clean_line = helpers.clean_line(line)
-                strip_line = line.strip()
-
-                if self.__line_description(strip_line): continue
-                if self.__line_name(clean_line, strip_line): continue
-                if self.__line_author(clean_line, strip_line): continue
-                if self.__line_part_type(clean_line, strip_line): continue
-                if self.__line_license(strip_line): continue
-                if self.__line_help(strip_line): continue
-                if self.__line_category(strip_line): continue
-                if self.__line_keywords(strip_line): continue
-                if self.__line_cmdline(strip_line): continue
-                if self.__line_history(strip_line): continue
-                if self.__line_comment(clean_line): continue
-                if self.__line_color(clean_line): continue
-                if self.__line_geometry(clean_line): continue
-                if self.__line_subfile(clean_line, strip_line): continue
-                if self.__line_bfc(clean_line, strip_line): continue
-                if self.__line_step(clean_line): continue
-                if self.__line_save(clean_line): continue
-                if self.__line_clear(clean_line): continue
-                if self.__line_print(clean_line): continue
-                if self.__line_ldcad(clean_line): continue
-                if self.__line_leocad(clean_line): continue
-                if self.__line_texmap(clean_line): continue
-                if self.__line_stud_io(clean_line): continue
+                if header and self.__parse_header_line(clean_line, strip_line):
+                    continue
+                ldraw_node = self.__parse_node_line(clean_line, strip_line)
             except Exception as e:
                 print(e)
                 import traceback
                 print(traceback.format_exc())
                 continue
 
+            if isinstance(ldraw_node, LDrawNode):
+                yield ldraw_node
+
+    def __parse_header_line(self, clean_line, strip_line):
+        if self.__line_description(strip_line): return True
+        if self.__line_name(clean_line, strip_line): return True
+        if self.__line_author(clean_line, strip_line): return True
+        if self.__line_part_type(clean_line, strip_line): return True
+        if self.__line_license(strip_line): return True
+        if self.__line_help(strip_line): return True
+        if self.__line_category(strip_line): return True
+        if self.__line_keywords(strip_line): return True
+        if self.__line_cmdline(strip_line): return True
+        if self.__line_history(strip_line): return True
+        if self.__line_comment(clean_line): return True
+        if self.__line_color(clean_line): return True
+        return False
+
+    def __parse_node_line(self, clean_line, strip_line):
+        return (self.__line_geometry(clean_line) or
+                self.__line_subfile(clean_line, strip_line) or
+                self.__line_bfc(clean_line, strip_line) or
+                self.__line_step(clean_line) or
+                self.__line_save(clean_line) or
+                self.__line_clear(clean_line) or
+                self.__line_print(clean_line) or
+                self.__line_ldcad(clean_line) or
+                self.__line_leocad(clean_line) or
+                self.__line_texmap(clean_line) or
+                self.__line_stud_io(clean_line))
+
+    @staticmethod
+    def __unused_line_types():
+        if ImportOptions.use_edges():
+            return ["5 "]
+        return ["2 ", "5 "]
+
+    def __record_node(self, ldraw_node):
+        self.__count_geometry(ldraw_node)
+        self.meta_commands.add(ldraw_node.meta_command)
+        if ldraw_node.meta_command == "1":
+            self.subfile_counts[ldraw_node.file] = self.subfile_counts.get(ldraw_node.file, 0) + 1
+
+    def __count_geometry(self, ldraw_node):
+        if ldraw_node.meta_command in ["2", "3", "4", "5"] or (ldraw_node.meta_command == "1" and ldraw_node.file.is_geometry()):
+            self.__count_line_type(ldraw_node.meta_command)
+
+    def __count_line_type(self, line_type):
+        self.geometry_commands.setdefault(line_type, 0)
+        self.geometry_commands[line_type] += 1
+
     # always return false so that the rest of the line types are parsed even if this is true
     def __line_description(self, strip_line):
         if self.description is None:
@@ -413,8 +839,7 @@ class LDrawFile:
             ldraw_node.line = clean_line
             ldraw_node.meta_command = "bfc"
             ldraw_node.meta_args["command"] = strip_line.split(maxsplit=2)[2]
-            self.child_nodes.append(ldraw_node)
-            return True
+            return ldraw_node
         return False
 
     def __line_step(self, clean_line):
@@ -422,8 +847,7 @@ class LDrawFile:
             ldraw_node = LDrawNode()
             ldraw_node.line = clean_line
             ldraw_node.meta_command = "step"
-            self.child_nodes.append(ldraw_node)
-            return True
+            return ldraw_node
         return False
 
     def __line_save(self, clean_line):
@@ -431,8 +855,7 @@ class LDrawFile:
             ldraw_node = LDrawNode()
             ldraw_node.line = clean_line
             ldraw_node.meta_command = "save"
-            self.child_nodes.append(ldraw_node)
-            return True
+            return ldraw_node
         return False
 
     def __line_clear(self, clean_line):
@@ -440,8 +863,7 @@ class LDrawFile:
             ldraw_node = LDrawNode()
             ldraw_node.line = clean_line
             ldraw_node.meta_command = "clear"
-            self.child_nodes.append(ldraw_node)
-            return True
+            return ldraw_node
         return False
 
     def __line_print(self, clean_line):
@@ -450,8 +872,7 @@ class LDrawFile:
             ldraw_node.line = clean_line
             ldraw_node.meta_command = "print"
             ldraw_node.meta_args["message"] = clean_line.split(maxsplit=2)[2]
-            self.child_nodes.append(ldraw_node)
-            return True
+            return ldraw_node
         return False
 
     # http://www.melkert.net/LDCad/tech/meta
@@ -464,7 +885,7 @@ class LDrawFile:
             # 0 !LDCAD GROUP_DEF [topLevel=true] [LID=119507361] [GID=FsMGcO9CYmY] [name=Group 12] [center=0 0 0]
             _params = re.search(r"\S+\s+\S+\s+\S+\s+(\[.*\])\s+(\[.*\])\s+(\[.*\])\s+(\[.*\])\s+(\[.*\])", clean_line)
             if not _params:
-                return
+                return None
 
             lid_str = _params[2]  # "[LID=119507361]"
             lid_args = re.search(r"\[(.*)=(.*)\]", lid_str)
@@ -480,8 +901,7 @@ class LDrawFile:
             (x, y, z) = map(float, center_str_val.split())
             ldraw_node.meta_args["center"] = mathutils.Vector((x, y, z))
 
-            self.child_nodes.append(ldraw_node)
-            return True
+            return ldraw_node
 
         if clean_line.startswith("0 !LDCAD GROUP_NXT "):
             ldraw_node = LDrawNode()
@@ -495,8 +915,7 @@ class LDrawFile:
             ids_args = re.search(r"\[(.*)=(.*)\]", ids_str)
             ldraw_node.meta_args["id"] = ids_args[2]  # "13016969"
 
-            self.child_nodes.append(ldraw_node)
-            return True
+            return ldraw_node
         return False
 
     # https://www.leocad.org/docs/meta.html
@@ -507,22 +926,19 @@ class LDrawFile:
             ldraw_node.line = clean_line
             ldraw_node.meta_command = "group_begin"
             ldraw_node.meta_args["name"] = name_args[4]
-            self.child_nodes.append(ldraw_node)
-            return True
+            return ldraw_node
 
         if clean_line.startswith("0 !LEOCAD GROUP END"):
             ldraw_node = LDrawNode()
             ldraw_node.line = clean_line
             ldraw_node.meta_command = "group_end"
-            self.child_nodes.append(ldraw_node)
-            return True
+            return ldraw_node
 
         if clean_line.startswith("0 !LEOCAD CAMERA "):
             ldraw_node = LDrawNode()
             ldraw_node.line = clean_line
             ldraw_node.meta_command = "leocad_camera"
-            self.child_nodes.append(ldraw_node)
-            return True
+            return ldraw_node
         return False
 
     def __line_texmap(self, clean_line):
@@ -530,8 +946,7 @@ class LDrawFile:
             ldraw_node = LDrawNode()
             ldraw_node.line = clean_line
             ldraw_node.meta_command = "texmap"
-            self.child_nodes.append(ldraw_node)
-            return True
+            return ldraw_node
         return False
 
     def __line_stud_io(self, clean_line):
@@ -539,23 +954,20 @@ class LDrawFile:
             ldraw_node = LDrawNode()
             ldraw_node.line = clean_line
             ldraw_node.meta_command = "pe_tex_path"
-            self.child_nodes.append(ldraw_node)
-            return True
+            return ldraw_node
 
         if clean_line.startswith("0 PE_TEX_INFO "):
             ldraw_node = LDrawNode()
             ldraw_node.line = clean_line
             ldraw_node.meta_command = "pe_tex_info"
-            self.child_nodes.append(ldraw_node)
-            return True
+            return ldraw_node
 
         # TODO: find out what this does
         if clean_line.startswith("0 PE_TEX_NEXT_SHEAR"):
             ldraw_node = LDrawNode()
             ldraw_node.line = clean_line
             ldraw_node.meta_command = "pe_tex_next_shear"
-            self.child_nodes.append(ldraw_node)
-            return True
+            return ldraw_node
         return False
 
     def __line_subfile(self, clean_line, strip_line):
@@ -573,29 +985,11 @@ class LDrawFile:
                 (0, 0, 0, 1)
             ))
 
-            # allows for extra spaces in the filename
-            filename = _sparams[14].lower()
-
-            # filename = "stud-logo.dat"
-            # parts = filename.split(".") => ["stud-logo", "dat"]
-            # name = parts[0] => "stud-logo"
-            # name_parts = name.split('-') => ["stud", "logo"]
-            # stud_name = name_parts[0] => "stud"
-            # chosen_logo = special_bricks.chosen_logo => "logo5"
-            # ext = parts[1] => "dat"
-            # filename = f"{stud_name}-{chosen_logo}.{ext}" => "stud-logo5.dat"
-            if ImportOptions.display_logo and filename in ldraw_part_types.stud_names:
-                parts = filename.split('.')
-                name = parts[0]
-                name_parts = name.split('-')
-                stud_name = name_parts[0]
-                chosen_logo = ImportOptions.chosen_logo_value()
-                ext = parts[1]
-                filename = f"{stud_name}-{chosen_logo}.{ext}"
-
-            ldraw_file = LDrawFile.get_file(filename)
+            filename = LDrawFile.__subfile_name(_sparams)
+            ldraw_file = LDrawFile.get_file(filename, resolution=self.resolution)
+            self.subfiles[filename] = ldraw_file
             if ldraw_file is None:
-                return True
+                return None
 
             ldraw_node = LDrawNode()
             ldraw_node.file = ldraw_file
@@ -603,15 +997,33 @@ class LDrawFile:
             ldraw_node.meta_command = "1"
             ldraw_node.color_code = color_code
             ldraw_node.matrix = matrix
-            self.child_nodes.append(ldraw_node)
-
-            if ldraw_file.is_geometry():
-                self.geometry_commands.setdefault(_params[0], 0)
-                self.geometry_commands[_params[0]] += 1
-
-            return True
+            return ldraw_node
         return False
 
+    # the filename of the subfile of a line type 1 split with maxsplit=14, with the stud logo swapped in
+    @staticmethod
+    def __subfile_name(_sparams):
+        # allows for extra spaces in the filename
+        filename = _sparams[14].lower()
+
+        # filename = "stud-logo.dat"
+        # parts = filename.split(".") => ["stud-logo", "dat"]
+        # name = parts[0] => "stud-logo"
+        # name_parts = name.split('-') => ["stud", "logo"]
+        # stud_name = name_parts[0] => "stud"
+        # chosen_logo = special_bricks.chosen_logo => "logo5"
+        # ext = parts[1] => "dat"
+        # filename = f"{stud_name}-{chosen_logo}.{ext}" => "stud-logo5.dat"
+        if ImportOptions.display_logo and filename in ldraw_part_types.stud_names:
+            parts = filename.split('.')
+            name = parts[0]
+            name_parts = name.split('-')
+            stud_name = name_parts[0]
+            chosen_logo = ImportOptions.chosen_logo_value()
+            ext = parts[1]
+            filename = f"{stud_name}-{chosen_logo}.{ext}"
+        return filename
+
     def __line_geometry(self, clean_line):
         if (clean_line.startswith("2 ") or
                 clean_line.startswith("3 ") or
@@ -619,18 +1031,24 @@ class LDrawFile:
                 clean_line.startswith("5 ")):
             _params = clean_line.split()
 
-            self.geometry_commands.setdefault(_params[0], 0)
-            self.geometry_commands[_params[0]] += 1
-
             ldraw_node = LDrawNode()
             ldraw_node.line = clean_line
             ldraw_node.meta_command = _params[0]
             ldraw_node.color_code = _params[1]
             ldraw_node.vertices = self.__parse_face(_params)
-            self.child_nodes.append(ldraw_node)
-            return True
+            ldraw_node.uvs = self.__parse_uvs(_params)
+            return ldraw_node
         return False
 
+    # Stud.io puts the uvs of each vertex of a triangle after its vertices
+    # 3 16 x1 y1 z1 x2 y2 z2 x3 y3 z3 u1 v1 u2 v2 u3 v3
+    # they're only used if the triangle is under a PE_TEX_INFO, but parsing them here means that's only done once per file
+    @staticmethod
+    def __parse_uvs(_params):
+        if _params[0] != "3" or len(_params) != 17:
+            return None
+        return np.array([round(float(x), 3) for x in _params[11:17]], dtype=np.float64).reshape((3, 2))
+
     @staticmethod
     def __parse_face(_params):
         line_type = _params[0]
@@ -648,14 +1066,8 @@ class LDrawFile:
             # 2.121 26.44  -19.293
             vert_count = 4
 
-        verts = []
-        for i in range(vert_count):
-            x = float(_params[i * 3 + 2])
-            y = float(_params[i * 3 + 3])
-            z = float(_params[i * 3 + 4])
-            vertex = mathutils.Vector((x, y, z))
-            verts.append(vertex)
-        return verts
+        verts = np.array(_params[2:vert_count * 3 + 2], dtype=np.float64)
+        return verts.reshape((vert_count, 3))
 
     # if there's a line type specified, determine what that type is
     @staticmethod
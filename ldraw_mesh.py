@@ -1,6 +1,7 @@
 import bpy
 import bmesh
 import mathutils
+import numpy as np
 
 from .blender_materials import BlenderMaterials
 from .import_options import ImportOptions
@@ -8,22 +9,69 @@ from . import special_bricks
 from . import strings
 from . import helpers
 from . import matrices
+from . import weld
+
+# geometry_data.key: (mesh name, material_slots)
+# the first mesh built from a geometry_data and what each of its material slots was made from
+# a material slot is (texmap, pe_texmap) if its faces take the color of the part and None otherwise
+source_meshes = {}
+
+
+def reset_caches():
+    source_meshes.clear()
 
 
 def create_mesh(key, geometry_data, color_code, return_mesh=False):
     mesh = bpy.data.meshes.get(key)
     if mesh is None or return_mesh:
         if mesh is None:
+            mesh = __copy_source_mesh(key, geometry_data, color_code)
+            if mesh is not None:
+                return mesh
             mesh = bpy.data.meshes.new(key)
         mesh.name = key
         mesh[strings.ldraw_filename_key] = geometry_data.file.name
-
-        __process_bmesh(mesh, geometry_data, color_code)
+        mesh.materials.clear()
+        # a mesh that is reused when return_mesh is True still has its geometry, which would be added to instead of replaced
+        mesh.clear_geometry()
+        while len(mesh.uv_layers) > 0:
+            mesh.uv_layers.remove(mesh.uv_layers[0])
+
+        geometry_data.restore()
+
+        if __uses_bmesh():
+            material_slots = __process_bmesh(mesh, geometry_data, color_code)
+        else:
+            material_slots = __process_mesh_faces(mesh, geometry_data, color_code)
         __process_mesh_sharp_edges(mesh, geometry_data)
         __process_mesh(mesh)
 
         mesh.transform(matrices.rotation_matrix)
 
+        source_meshes[geometry_data.key] = (mesh.name, material_slots)
+
+    return mesh
+
+
+# geometry_data has the same faces for every color, only the materials of faces with color code 16 differ
+# so once a mesh for it is built, the other colors copy that mesh and swap the materials of those slots
+def __copy_source_mesh(key, geometry_data, color_code):
+    source_mesh = source_meshes.get(geometry_data.key)
+    if source_mesh is None:
+        return None
+
+    mesh_name, material_slots = source_mesh
+    mesh = bpy.data.meshes.get(mesh_name)
+    if mesh is None:
+        return None
+
+    mesh = mesh.copy()
+    mesh.name = key
+    for i, material_slot in enumerate(material_slots):
+        if material_slot is None:
+            continue
+        texmap, pe_texmap = material_slot
+        mesh.materials[i] = __get_material(geometry_data, color_code, "16", texmap, pe_texmap)
     return mesh
 
 
@@ -32,18 +80,12 @@ def create_mesh(key, geometry_data, color_code, return_mesh=False):
 def create_edge_mesh(key, geometry_data):
     mesh = bpy.data.meshes.get(key)
     if mesh is None:
-        e_verts = []
-        e_edges = []
-        e_faces = []
+        geometry_data.restore()
+        edge_data = geometry_data.edge_data
 
-        i = 0
-        for edge_data in geometry_data.edge_data:
-            face_indices = []
-            for vertex in edge_data.vertices:
-                e_verts.append(vertex)
-                face_indices.append(i)
-                i += 1
-            e_faces.append(face_indices)
+        e_verts = edge_data.get_vertices().tolist()
+        e_edges = []
+        e_faces = [list(range(offset, offset + size)) for offset, size in zip(edge_data.offsets, edge_data.sizes)]
 
         mesh = bpy.data.meshes.new(key)
         mesh.name = key
@@ -56,17 +98,102 @@ def create_edge_mesh(key, geometry_data):
     return mesh
 
 
+# bmesh is only needed for the options that use bmesh operators
+# otherwise the mesh is filled straight from the arrays of geometry_data
+def __uses_bmesh():
+    return ImportOptions.recalculate_normals or ImportOptions.smooth_type_value() == "bmesh_split"
+
+
+# every face has its own vertices like the faces made with bmesh, so every loop is its own vertex
+# unless remove_doubles is used, then vertices are welded before the mesh is made
+# loop_total can't be set in newer versions of blender since it's worked out from loop_start
+def __process_mesh_faces(mesh, geometry_data, color_code):
+    face_data = geometry_data.face_data
+    material_indices, material_slots = __get_material_indices(mesh, geometry_data, color_code)
+    uvs = __get_loop_uvs(face_data)
+
+    vertices = face_data.get_vertices()
+    loop_vertices = np.arange(len(vertices))
+    sizes = np.frombuffer(face_data.sizes, dtype=np.int32)
+
+    if ImportOptions.remove_doubles:
+        vertices, loop_vertices = weld.weld_vertices(vertices, ImportOptions.merge_distance)
+        keep_loops, keep_faces = __get_welded_faces(loop_vertices, sizes)
+        loop_vertices = loop_vertices[keep_loops]
+        sizes = np.bincount(np.repeat(np.arange(len(sizes)), sizes)[keep_loops], minlength=len(sizes))[keep_faces].astype(np.int32)
+        material_indices = material_indices[keep_faces]
+        if uvs is not None:
+            uvs = uvs[keep_loops]
+
+    offsets = (np.cumsum(sizes) - sizes).astype(np.int32)
+
+    mesh.vertices.add(len(vertices))
+    mesh.vertices.foreach_set("co", vertices.ravel())
+    mesh.loops.add(len(loop_vertices))
+    mesh.loops.foreach_set("vertex_index", loop_vertices.astype(np.int32))
+    mesh.polygons.add(len(sizes))
+    mesh.polygons.foreach_set("loop_start", offsets)
+    if not bpy.types.MeshPolygon.bl_rna.properties["loop_total"].is_readonly:
+        mesh.polygons.foreach_set("loop_total", sizes)
+    mesh.polygons.foreach_set("material_index", material_indices)
+    mesh.polygons.foreach_set("use_smooth", np.full(len(sizes), ImportOptions.shade_smooth, dtype=bool))
+
+    if uvs is not None:
+        uv_layer = mesh.uv_layers.new()
+        uv_layer.data.foreach_set("uv", uvs.astype(np.float32).ravel())
+
+    mesh.update(calc_edges=True)
+    return material_slots
+
+
+# which loops and faces are left once the vertices of faces are welded
+# a loop is dropped if it has the same vertex as the loop before it, which is what welding the vertices of an edge does
+# a face is dropped if that leaves it with less than 3 loops or if it still has a vertex more than once
+# faces that end up with the same vertices as a face before them are dropped too, like bmesh does when it welds vertices
+def __get_welded_faces(loop_vertices, sizes):
+    offsets = np.cumsum(sizes) - sizes
+    face_ids = np.repeat(np.arange(len(sizes)), sizes)
+
+    previous_loops = np.arange(len(loop_vertices)) - 1
+    previous_loops[offsets] = offsets + sizes - 1
+    keep_loops = loop_vertices != loop_vertices[previous_loops]
+
+    kept_sizes = np.bincount(face_ids[keep_loops], minlength=len(sizes))
+    keep_faces = kept_sizes >= 3
+
+    # sorted by face then vertex, a face has a vertex more than once if two of them in a row are the same
+    kept_face_ids = face_ids[keep_loops]
+    face_vertices = np.stack([kept_face_ids, loop_vertices[keep_loops]], axis=1)
+    face_vertices = face_vertices[np.lexsort((face_vertices[:, 1], face_vertices[:, 0]))]
+    repeated = np.all(face_vertices[1:] == face_vertices[:-1], axis=1)
+    keep_faces[face_vertices[1:, 0][repeated]] = False
+
+    # every face left as a row of its sorted vertices padded with -1, so faces with the same vertices have the same row
+    face_vertices = face_vertices[keep_faces[face_vertices[:, 0]]]
+    if len(face_vertices) > 0:
+        faces, starts, counts = np.unique(face_vertices[:, 0], return_index=True, return_counts=True)
+        rows = np.full((len(faces), counts.max()), -1, dtype=face_vertices.dtype)
+        rows[np.repeat(np.arange(len(faces)), counts), np.arange(len(face_vertices)) - np.repeat(starts, counts)] = face_vertices[:, 1]
+        firsts = np.unique(rows, axis=0, return_index=True)[1]
+        keep_faces[faces] = False
+        keep_faces[faces[firsts]] = True
+
+    keep_loops &= keep_faces[face_ids]
+    return keep_loops, keep_faces
+
+
 # https://b3d.interplanety.org/en/how-to-get-global-vertex-coordinates/
 # https://blender.stackexchange.com/questions/50160/scripting-low-level-join-meshes-elements-hopefully-with-bmesh
 # https://blender.stackexchange.com/questions/188039/how-to-join-only-two-objects-to-create-a-new-object-using-python
 # https://blender.stackexchange.com/questions/23905/select-faces-depending-on-material
 def __process_bmesh(mesh, geometry_data, color_code):
-    bm = __process_bmesh_faces(mesh, geometry_data, color_code)
+    bm, material_slots = __process_bmesh_faces(mesh, geometry_data, color_code)
     helpers.ensure_bmesh(bm)
-    __clean_bmesh(bm)
+    __clean_bmesh(bm, geometry_data)
     __process_bmesh_edges(bm, geometry_data)
     helpers.finish_bmesh(bm, mesh)
     helpers.finish_mesh(mesh)
+    return material_slots
 
 
 # bpy.context.object.data.edges[6].use_edge_sharp = True
@@ -88,11 +215,11 @@ def __get_edge_indices(verts, geometry_data):
 
     edge_indices = set()
 
-    for edge_data in geometry_data.edge_data:
-        edge_verts = []
-        # for vertex in edge_data.vertices[0:2]:  # in case line_data is being used since it has 4 verts
-        for vertex in edge_data.vertices:
-            edge_verts.append(vertex)
+    edge_data = geometry_data.edge_data
+    edge_vertices = edge_data.get_vertices().tolist()
+    for offset in edge_data.offsets:
+        # only the first 2 in case line_data is being used since it has 4 verts
+        edge_verts = edge_vertices[offset:offset + 2]
 
         edges0 = [index for (co, index, dist) in kd.find_range(edge_verts[0], distance)]
         edges1 = [index for (co, index, dist) in kd.find_range(edge_verts[1], distance)]
@@ -122,47 +249,145 @@ def __process_bmesh_edges(bm, geometry_data):
         bmesh.ops.split_edges(bm, edges=list(edges))
 
 
+# faces that take the color of the part get different material slots than faces that have
+# their own color, even if they have the same material, so that the slots can be swapped for other colors
 def __process_bmesh_faces(mesh, geometry_data, color_code):
     bm = bmesh.new()
 
-    for face_data in geometry_data.face_data:
-        verts = [bm.verts.new(vertex) for vertex in face_data.vertices]
+    face_data = geometry_data.face_data
+    material_indices, material_slots = __get_material_indices(mesh, geometry_data, color_code)
+    material_indices = material_indices.tolist()
+    texmap_uvs = __project_texmap_uvs(face_data)
+    uv_layer = None
+    if texmap_uvs is not None:
+        uv_layer = bm.loops.layers.uv.verify()
+        texmap_uvs = texmap_uvs.tolist()
+
+    vertices = face_data.get_vertices().tolist()
+    for i in range(len(face_data)):
+        offset = face_data.offsets[i]
+        verts = [bm.verts.new(vertex) for vertex in vertices[offset:offset + face_data.sizes[i]]]
         face = bm.faces.new(verts)
 
-        c = color_code if face_data.color_code == "16" else face_data.color_code
-
-        part_slopes = special_bricks.get_part_slopes(geometry_data.file.name)
-        parts_cloth = special_bricks.get_parts_cloth(geometry_data.file.name)
-        material = BlenderMaterials.get_material(
-            color_code=c,
-            bfc_certified=geometry_data.bfc_certified,
-            part_slopes=part_slopes,
-            parts_cloth=parts_cloth,
-            texmap=face_data.texmap,
-            pe_texmap=face_data.pe_texmap,
-        )
-
-        material_index = mesh.materials.find(material.name)
-        if material_index == -1:
-            # mesh.materials.append(None) #add blank slot
-            mesh.materials.append(material)
-            material_index = mesh.materials.find(material.name)
+        texmap = face_data.get_texmap(i)
+        pe_texmap = face_data.get_pe_texmap(i)
 
-        face.material_index = material_index
+        face.material_index = material_indices[i]
         face.smooth = ImportOptions.shade_smooth
 
-        if face_data.texmap is not None:
-            face_data.texmap.uv_unwrap_face(bm, face)
-
-        if face_data.pe_texmap is not None:
-            face_data.pe_texmap.uv_unwrap_face(bm, face)
-
-    return bm
-
-
-def __clean_bmesh(bm):
+        if texmap is not None:
+            for loop, uv in zip(face.loops, texmap_uvs[offset:offset + face_data.sizes[i]]):
+                loop[uv_layer].uv = uv
+
+        if pe_texmap is not None:
+            pe_texmap.uv_unwrap_face(bm, face)
+
+    return bm, material_slots
+
+
+# the material slot of every face as an array and what each slot was made from, see source_meshes
+# faces with the same color, texmap and pe_texmap have the same material, so it's only looked up once for all of them
+# slots are added in the order of the first face that uses them
+def __get_material_indices(mesh, geometry_data, color_code):
+    face_data = geometry_data.face_data
+    material_slots = []
+    if len(face_data) < 1:
+        return np.zeros(0, dtype=np.int32), material_slots
+
+    ids = np.stack([
+        np.frombuffer(face_data.color_ids, dtype=np.int32),
+        np.frombuffer(face_data.texmap_ids, dtype=np.int32),
+        np.frombuffer(face_data.pe_texmap_ids, dtype=np.int32),
+    ], axis=1)
+    combinations, first_faces, inverse = np.unique(ids, axis=0, return_index=True, return_inverse=True)
+
+    material_indices = {}
+    combination_indices = np.zeros(len(combinations), dtype=np.int32)
+    for combination in np.argsort(first_faces):
+        i = first_faces[combination]
+        face_color_code = face_data.get_color_code(i)
+        texmap = face_data.get_texmap(i)
+        pe_texmap = face_data.get_pe_texmap(i)
+        material = __get_material(geometry_data, color_code, face_color_code, texmap, pe_texmap)
+
+        inherits_color = face_color_code == "16"
+        material_index = material_indices.get((inherits_color, material.name))
+        if material_index is None:
+            # mesh.materials.append(None) #add blank slot
+            mesh.materials.append(material)
+            material_index = len(mesh.materials) - 1
+            material_indices[(inherits_color, material.name)] = material_index
+
+            material_slot = None
+            if inherits_color:
+                material_slot = (texmap, pe_texmap)
+            material_slots.append(material_slot)
+        combination_indices[combination] = material_index
+
+    return combination_indices[inverse.reshape(-1)], material_slots
+
+
+# the uv of every loop of face_data as an (n, 2) array, zero where a face has no texmap or pe_texmap
+# None if no face has either
+def __get_loop_uvs(face_data):
+    uvs = __project_texmap_uvs(face_data)
+    if len(face_data.pe_texmaps) < 1:
+        return uvs
+
+    vertices = face_data.get_vertices()
+    if uvs is None:
+        uvs = np.zeros((len(vertices), 2), dtype=np.float64)
+
+    # a pe_texmap's uvs replace the texmap's like uv_unwrap_face does
+    for i in np.flatnonzero(np.frombuffer(face_data.pe_texmap_ids, dtype=np.int32) >= 0):
+        offset = face_data.offsets[i]
+        size = face_data.sizes[i]
+        uvs[offset:offset + size] = face_data.get_pe_texmap(i).face_uvs(vertices[offset:offset + size])
+    return uvs
+
+
+# the texmap uv of every vertex of face_data as an (n, 2) array, zero where a face has no texmap
+# each texmap projects every vertex of every face that uses it at once
+# None if no face has a texmap
+def __project_texmap_uvs(face_data):
+    if len(face_data.texmaps) < 1:
+        return None
+
+    vertices = face_data.get_vertices()
+    sizes = np.frombuffer(face_data.sizes, dtype=np.int32)
+    vertex_texmap_ids = np.repeat(np.frombuffer(face_data.texmap_ids, dtype=np.int32), sizes)
+
+    uvs = np.zeros((len(vertices), 2), dtype=np.float64)
+    for texmap_id, texmap in enumerate(face_data.texmaps):
+        mask = vertex_texmap_ids == texmap_id
+        texmap_uvs = texmap.project_uvs(vertices[mask])
+        if texmap_uvs is not None:
+            uvs[mask] = texmap_uvs
+    return uvs
+
+
+def __get_material(geometry_data, color_code, face_color_code, texmap, pe_texmap):
+    c = color_code if face_color_code == "16" else face_color_code
+
+    part_slopes = special_bricks.get_part_slopes(geometry_data.file.name)
+    parts_cloth = special_bricks.get_parts_cloth(geometry_data.file.name)
+    return BlenderMaterials.get_material(
+        color_code=c,
+        bfc_certified=geometry_data.bfc_certified,
+        part_slopes=part_slopes,
+        parts_cloth=parts_cloth,
+        texmap=texmap,
+        pe_texmap=pe_texmap,
+    )
+
+
+# bm has a vertex for every vertex of face_data in the same order, so they're welded the same way as the meshes that don't use bmesh
+def __clean_bmesh(bm, geometry_data):
     if ImportOptions.remove_doubles:
-        bmesh.ops.remove_doubles(bm, verts=bm.verts[:], dist=ImportOptions.merge_distance)
+        welded_vertices, indices = weld.weld_vertices(geometry_data.face_data.get_vertices(), ImportOptions.merge_distance)
+        firsts = np.unique(indices, return_index=True)[1]
+        targetmap = {bm.verts[i]: bm.verts[first] for i, first in enumerate(firsts[indices].tolist()) if first != i}
+        bmesh.ops.weld_verts(bm, targetmap=targetmap)
 
     # recalculate_normals completely overwrites any bfc processing
     if ImportOptions.recalculate_normals:
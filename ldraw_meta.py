@@ -1,4 +1,3 @@
-import bpy
 import mathutils
 
 from .import_options import ImportOptions
@@ -28,20 +27,21 @@ def reset_caches():
     camera = None
 
 
-def meta_bfc(ldraw_node, child_node, matrix, local_cull, winding, invert_next, accum_invert):
+# determinant is the determinant of the matrix the geometry of ldraw_frame is transformed by
+def meta_bfc(ldraw_frame, child_node, determinant, local_cull, winding, invert_next, accum_invert):
     clean_line = child_node.line
     _params = clean_line.split()[2:]
 
     # https://www.ldraw.org/article/415.html#processing
-    if ldraw_node.bfc_certified is not False:
-        if ldraw_node.bfc_certified is None and "NOCERTIFY" not in _params:
-            ldraw_node.bfc_certified = True
+    if ldraw_frame.bfc_certified is not False:
+        if ldraw_frame.bfc_certified is None and "NOCERTIFY" not in _params:
+            ldraw_frame.bfc_certified = True
 
         if "CERTIFY" in _params:
-            ldraw_node.bfc_certified = True
+            ldraw_frame.bfc_certified = True
 
         if "NOCERTIFY" in _params:
-            ldraw_node.bfc_certified = False
+            ldraw_frame.bfc_certified = False
 
         """
         https://www.ldraw.org/article/415.html#rendering
@@ -55,8 +55,8 @@ def meta_bfc(ldraw_node, child_node, matrix, local_cull, winding, invert_next, a
         A singular (or degenerate) matrix is a square matrix whose inverse matrix cannot be calculated.
         Therefore, the determinant of a singular matrix is equal to 0.
         """
-        if matrix.determinant() == 0:
-            ldraw_node.bfc_certified = False
+        if determinant == 0:
+            ldraw_frame.bfc_certified = False
 
     if "CLIP" in _params:
         local_cull = True
@@ -95,7 +95,7 @@ def meta_bfc(ldraw_node, child_node, matrix, local_cull, winding, invert_next, a
     If the matrix applied to the subpart or primitive has itself been reversed the INVERTNEXT processing
     is done IN ADDITION TO the automatic inversion - the two effectively cancelling each other out.
     """
-    if matrix.determinant() < 0:
+    if determinant < 0:
         if not invert_next:
             if winding == "CW":
                 winding = "CCW"
@@ -109,6 +109,8 @@ def meta_step():
     global current_step
     global current_frame
 
+    import bpy
+
     if not ImportOptions.meta_step:
         return
 
@@ -132,6 +134,18 @@ def meta_step():
         group.current_step_group = step_collection
 
 
+# whether the parts of the current step are imported, see ImportOptions.first_step
+# steps outside the range are still counted so that the frames and collections of the ones inside it are the same
+def is_step_imported():
+    if not ImportOptions.meta_step:
+        return True
+    if current_step < ImportOptions.first_step:
+        return False
+    if ImportOptions.last_step > 0 and current_step > ImportOptions.last_step:
+        return False
+    return True
+
+
 def do_meta_step(obj):
     if ImportOptions.meta_step:
         helpers.hide_obj(obj)
@@ -144,12 +158,16 @@ def do_meta_step(obj):
 
 
 def meta_save():
+    import bpy
+
     if ImportOptions.meta_save:
         if ImportOptions.set_timeline_markers:
             bpy.context.scene.timeline_markers.new("SAVE", frame=current_frame)
 
 
 def meta_clear():
+    import bpy
+
     if ImportOptions.meta_clear:
         if ImportOptions.set_timeline_markers:
             bpy.context.scene.timeline_markers.new("CLEAR", frame=current_frame)
@@ -186,6 +204,8 @@ def meta_group_def(child_node):
 
 
 def meta_group_nxt(child_node):
+    import bpy
+
     group.stored_collection = group.next_collection
     collection = None
     if child_node.meta_args["id"] in group.collection_id_map:
@@ -221,8 +241,8 @@ def meta_group_end():
         group.next_collection = None
 
 
-def meta_root_group_nxt(ldraw_node, child_node):
-    if ldraw_node.is_root and ImportOptions.meta_group:
+def meta_root_group_nxt(ldraw_frame, child_node):
+    if ldraw_frame.is_root and ImportOptions.meta_group:
         if child_node.meta_command != "group_nxt":
             if group.end_next_collection:
                 group.next_collection = None
@@ -287,25 +307,49 @@ def meta_leocad_camera(child_node, matrix):
             _params = _params[1:]
 
 
+# the cameras of ldraw_file without adding them to cameras
+# used to know where cameras are before ldraw_file is loaded
+# matrix is the matrix the lines of ldraw_file are transformed by
+def read_leocad_cameras(ldraw_file, matrix):
+    global cameras
+    global camera
+
+    if "leocad_camera" not in ldraw_file.meta_commands:
+        return []
+
+    loaded_cameras = cameras
+    loaded_camera = camera
+    cameras = []
+    camera = None
+    try:
+        for child_node in ldraw_file.iter_child_nodes():
+            if child_node.meta_command == "leocad_camera":
+                meta_leocad_camera(child_node, matrix)
+        return cameras
+    finally:
+        cameras = loaded_cameras
+        camera = loaded_camera
+
+
 # https://www.ldraw.org/documentation/ldraw-org-file-format-standards/language-extension-for-texture-mapping.html
 
-def meta_texmap(ldraw_node, child_node, matrix):
+def meta_texmap(ldraw_frame, child_node, matrix):
     if not ImportOptions.meta_texmap:
         return
 
     clean_line = child_node.line
 
-    if ldraw_node.texmap_start:
+    if ldraw_frame.texmap_start:
         if clean_line == "0 !TEXMAP FALLBACK":
-            ldraw_node.texmap_fallback = True
+            ldraw_frame.texmap_fallback = True
         elif clean_line == "0 !TEXMAP END":
-            set_texmap_end(ldraw_node)
+            set_texmap_end(ldraw_frame)
     elif clean_line.startswith("0 !TEXMAP START ") or clean_line.startswith("0 !TEXMAP NEXT "):
         if clean_line.startswith("0 !TEXMAP START "):
-            ldraw_node.texmap_start = True
+            ldraw_frame.texmap_start = True
         elif clean_line.startswith("0 !TEXMAP NEXT "):
-            ldraw_node.texmap_next = True
-        ldraw_node.texmap_fallback = False
+            ldraw_frame.texmap_next = True
+        ldraw_frame.texmap_fallback = False
 
         method = clean_line.split()[3]
 
@@ -368,34 +412,37 @@ def meta_texmap(ldraw_node, child_node, matrix):
             new_texmap.texture = texture
             new_texmap.glossmap = glossmap
 
-        if ldraw_node.texmap is not None:
-            ldraw_node.texmaps.append(ldraw_node.texmap)
-        ldraw_node.texmap = new_texmap
+        # the state is shared with the files that were loaded with it so a new one is made
+        state = ldraw_frame.state
+        texmaps = state.texmaps
+        if state.texmap is not None:
+            texmaps = texmaps + (state.texmap,)
+        ldraw_frame.state = state._replace(texmap=new_texmap, texmaps=texmaps)
 
 
-def set_texmap_end(ldraw_node):
-    try:
-        ldraw_node.texmap = ldraw_node.texmaps.pop()
-    except IndexError as e:
-        print(e)
-        import traceback
-        print(traceback.format_exc())
-        ldraw_node.texmap = None
+def set_texmap_end(ldraw_frame):
+    state = ldraw_frame.state
+    texmap = None
+    texmaps = state.texmaps
+    if len(texmaps) > 0:
+        texmap = texmaps[-1]
+        texmaps = texmaps[:-1]
+    ldraw_frame.state = state._replace(texmap=texmap, texmaps=texmaps)
 
-    ldraw_node.texmap_start = False
-    ldraw_node.texmap_next = False
-    ldraw_node.texmap_fallback = False
+    ldraw_frame.texmap_start = False
+    ldraw_frame.texmap_next = False
+    ldraw_frame.texmap_fallback = False
 
 
-def meta_pe_tex(ldraw_node, child_node, matrix):
+def meta_pe_tex(ldraw_frame, child_node, matrix):
     if child_node.meta_command == "pe_tex_info":
-        meta_pe_tex_info(ldraw_node, child_node, matrix)
+        meta_pe_tex_info(ldraw_frame, child_node, matrix)
     elif child_node.meta_command == "pe_tex_next_shear":
         """no idea"""
     else:
-        ldraw_node.current_pe_tex_path = None
+        ldraw_frame.current_pe_tex_path = None
         if child_node.meta_command == "pe_tex_path":
-            meta_pe_tex_path(ldraw_node, child_node)
+            meta_pe_tex_path(ldraw_frame, child_node)
 
 
 # 0 PE_TEX_PATH 5 0
@@ -409,21 +456,21 @@ def meta_pe_tex(ldraw_node, child_node, matrix):
 # >= 0 is the file at the nth subfile_line_index
 # second arg is the nth subfile_line_index of line of file at that line
 # PE_TEX_PATH 5 4 is self.line_type_1_list[5].line_type_1_list[4]
-def meta_pe_tex_path(ldraw_node, child_node):
+def meta_pe_tex_path(ldraw_frame, child_node):
     clean_line = child_node.line
     _params = clean_line.split()[2:]
 
-    ldraw_node.current_pe_tex_path = int(_params[0])
+    ldraw_frame.current_pe_tex_path = int(_params[0])
     if len(_params) == 4:
-        ldraw_node.current_subfile_pe_tex_path = int(_params[1])
+        ldraw_frame.current_subfile_pe_tex_path = int(_params[1])
 
 
 # PE_TEX_INFO bse64_str uses the file's uvs
 # PE_TEX_INFO x,y,z,a,b,c,d,e,f,g,h,i,bl/tl,tr/br is matrix and plane coordinates for uv calculations
 # multiple PE_TEX_INFO have to be flattened into one
 # if no matrix, identity @ rotation?
-def meta_pe_tex_info(ldraw_node, child_node, matrix):
-    if ldraw_node.current_pe_tex_path is None:
+def meta_pe_tex_info(ldraw_frame, child_node, matrix):
+    if ldraw_frame.current_pe_tex_path is None:
         return
 
     clean_line = child_node.line
@@ -538,24 +585,24 @@ def meta_pe_tex_info(ldraw_node, child_node, matrix):
         return
 
     from . import base64_handler
-    image = base64_handler.named_png_from_base64_str(f"{ldraw_node.file.name}_{ldraw_node.current_pe_tex_path}.png", base64_str)
+    image = base64_handler.named_png_from_base64_str(f"{ldraw_frame.file.name}_{ldraw_frame.current_pe_tex_path}.png", base64_str)
 
     pe_tex_info.image = image.name
 
-    if ldraw_node.current_subfile_pe_tex_path is not None:
-        ldraw_node.subfile_pe_tex_infos.setdefault(ldraw_node.current_pe_tex_path, {})
-        ldraw_node.subfile_pe_tex_infos[ldraw_node.current_pe_tex_path].setdefault(ldraw_node.current_subfile_pe_tex_path, [])
-        ldraw_node.subfile_pe_tex_infos[ldraw_node.current_pe_tex_path][ldraw_node.current_subfile_pe_tex_path].append(pe_tex_info)
+    if ldraw_frame.current_subfile_pe_tex_path is not None:
+        ldraw_frame.subfile_pe_tex_infos.setdefault(ldraw_frame.current_pe_tex_path, {})
+        ldraw_frame.subfile_pe_tex_infos[ldraw_frame.current_pe_tex_path].setdefault(ldraw_frame.current_subfile_pe_tex_path, [])
+        ldraw_frame.subfile_pe_tex_infos[ldraw_frame.current_pe_tex_path][ldraw_frame.current_subfile_pe_tex_path].append(pe_tex_info)
     else:
-        ldraw_node.pe_tex_infos.setdefault(ldraw_node.current_pe_tex_path, [])
-        ldraw_node.pe_tex_infos[ldraw_node.current_pe_tex_path].append(pe_tex_info)
+        ldraw_frame.pe_tex_infos.setdefault(ldraw_frame.current_pe_tex_path, [])
+        ldraw_frame.pe_tex_infos[ldraw_frame.current_pe_tex_path].append(pe_tex_info)
 
-    if ldraw_node.current_pe_tex_path == -1:
-        ldraw_node.pe_tex_info = ldraw_node.pe_tex_infos[ldraw_node.current_pe_tex_path]
+    if ldraw_frame.current_pe_tex_path == -1:
+        ldraw_frame.pe_tex_info = ldraw_frame.pe_tex_infos[ldraw_frame.current_pe_tex_path]
 
 
-def meta_edge(child_node, color_code, matrix, geometry_data):
-    vertices = [matrix @ v for v in child_node.vertices]
+def meta_edge(child_node, color_code, vertices, geometry_data):
+    vertices = vertices[child_node.vertex_index:child_node.vertex_index + len(child_node.vertex_order)]
 
     geometry_data.add_edge_data(
         vertices=vertices,
@@ -563,20 +610,20 @@ def meta_edge(child_node, color_code, matrix, geometry_data):
     )
 
 
-def meta_face(ldraw_node, child_node, color_code, matrix, geometry_data, winding):
-    vertices = FaceData.handle_vertex_winding(child_node, matrix, winding)
-    pe_texmap = PETexmap.build_pe_texmap(ldraw_node, child_node)
+def meta_face(ldraw_frame, child_node, color_code, vertices, geometry_data, winding):
+    vertices = FaceData.handle_vertex_winding(child_node, vertices, winding)
+    pe_texmap = PETexmap.build_pe_texmap(ldraw_frame, child_node)
 
     geometry_data.add_face_data(
         vertices=vertices,
         color_code=color_code,
-        texmap=ldraw_node.texmap,
+        texmap=ldraw_frame.state.texmap,
         pe_texmap=pe_texmap,
     )
 
 
-def meta_line(child_node, color_code, matrix, geometry_data):
-    vertices = [matrix @ v for v in child_node.vertices]
+def meta_line(child_node, color_code, vertices, geometry_data):
+    vertices = vertices[child_node.vertex_index:child_node.vertex_index + len(child_node.vertex_order)]
 
     geometry_data.add_line_data(
         vertices=vertices,
@@ -1,12 +1,90 @@
 import uuid
+from collections import namedtuple
+
+import mathutils
+import numpy as np
 
 from .geometry_data import GeometryData
 from .import_options import ImportOptions
+from . import geometry_spill
 from . import group
-from . import ldraw_mesh
-from . import ldraw_object
 from . import ldraw_meta
 from . import matrices
+from . import occlusion_culling
+from . import part_lod
+from . import special_bricks
+from . import stud_culling
+
+# what a file is loaded with
+# matrix and determinant are what the geometry of the file is transformed by
+# texmaps is the stack of texmaps that texmap is pushed onto by TEXMAP START
+# a state is never changed once it is made, a changed copy is made with _replace instead
+# so the same state can be shared by any number of files that are being loaded
+LoadState = namedtuple("LoadState", "color_code matrix determinant accum_matrix accum_cull accum_invert texmap texmaps pe_tex_info pe_tex_infos geometry_data collection")
+
+# every part of a model file with its submodels flattened out
+# nodes are the subfile lines of the parts, color_codes are their colors where 16 is the color the model is used with
+# matrices is an (n, 4, 4) array of where each part is relative to the model
+# submodels is the (filename, parent) of every submodel under the model in the order they are entered
+# submodel_ids is the index into submodels of the submodel each part is in, parent and submodel_ids are -1 for the model itself
+# inverts is whether each part is under an odd number of BFC INVERTNEXT along the way
+ModelPlacements = namedtuple("ModelPlacements", "nodes color_codes matrices submodel_ids submodels inverts")
+
+
+class LDrawFrame:
+    """
+    A file that is being walked by LDrawNode.load.
+    """
+
+    # ldraw_file is walked instead of the file of ldraw_node, like the same part with other primitives
+    def __init__(self, ldraw_node, state, walk=True, ldraw_file=None):
+        if ldraw_file is None:
+            ldraw_file = ldraw_node.file
+
+        self.node = ldraw_node
+        self.file = ldraw_file
+        self.is_root = ldraw_node.is_root
+        self.state = state
+
+        self.child_nodes = iter(())
+        # frames of the parts of a model that is placed from its placements, walked before child_nodes
+        self.placed_frames = None
+        self.vertices = None
+        if walk:
+            self.child_nodes = iter(self.file.iter_child_nodes())
+            # every vertex of this file's line type 2, 3, 4 and 5 transformed at once
+            if self.file.vertices is not None:
+                self.vertices = matrices.transform_vertices(state.matrix, self.file.vertices)
+
+        self.subfile_line_index = 0
+        self.local_cull = True
+        self.winding = "CCW"
+        self.invert_next = False
+        self.bfc_certified = None
+
+        self.texmap_start = False
+        self.texmap_next = False
+        self.texmap_fallback = False
+
+        self.current_pe_tex_path = None
+        self.current_subfile_pe_tex_path = None
+        self.pe_tex_info = state.pe_tex_info
+        self.pe_tex_infos = {k: list(v) for k, v in state.pe_tex_infos.items()}
+        self.subfile_pe_tex_infos = {}
+
+        # a part is walked with color code 16, color_code is the color its object is created with
+        self.is_top = False
+        self.color_code = state.color_code
+        self.geometry_data_key = None
+        self.mesh_key = None
+        # the indices of the studs of a part that are covered by another part, see stud_culling
+        self.hidden_studs = ()
+        self.obj_matrix = None
+        self.return_mesh = False
+
+        # the bounds of every part created under this file, in the space objects are placed in
+        self.is_model = False
+        self.bounds = None
 
 
 class LDrawNode:
@@ -15,17 +93,47 @@ class LDrawNode:
     """
 
     part_count = 0
+    # parts that weren't created because they were outside of the frustum
+    culled_count = 0
+    # parts that weren't created because they were inside of the model, see occlusion_culling
+    occluded_count = 0
     current_filename = ""
     current_model_filename = ""
 
+    # the bounds of every part that was created and of every use of a model, in the space objects are placed in
+    # submodel_bounds is (filename, collection, bounds) for every model file that was loaded
+    bounds = None
+    submodel_bounds = []
+
+    # parts outside of it are not created, see Frustum
+    frustum = None
+
     key_map = {}
     geometry_datas = {}
+    # (content hash, ...): the first geometry_data with that content, see __share_geometry_data
+    content_geometry_datas = {}
+    baked_geometry_datas = {}
+    bakeable_files = {}
+    placeable_files = {}
+    model_placements = {}
+    part_counts = {}
 
     @classmethod
     def reset_caches(cls):
         cls.part_count = 0
+        cls.culled_count = 0
+        cls.occluded_count = 0
+        cls.bounds = None
+        cls.frustum = None
+        cls.submodel_bounds.clear()
         cls.key_map.clear()
         cls.geometry_datas.clear()
+        cls.content_geometry_datas.clear()
+        cls.baked_geometry_datas.clear()
+        cls.bakeable_files.clear()
+        cls.placeable_files.clear()
+        cls.model_placements.clear()
+        cls.part_counts.clear()
 
     def __init__(self):
         self.is_root = False
@@ -34,64 +142,149 @@ class LDrawNode:
         self.color_code = "16"
         self.matrix = matrices.identity_matrix
         self.vertices = []
-        self.bfc_certified = None
+        self.vertex_index = 0
+        self.vertex_order = None
+        # (3, 2) array of the uvs Stud.io puts at the end of a triangle line, see LDrawFile.__parse_uvs
+        self.uvs = None
         self.meta_command = None
         self.meta_args = {}
 
-        self.texmap_start = False
-        self.texmap_next = False
-        self.texmap_fallback = False
-        self.texmaps = []
-        self.texmap = None
+    # nodes are shared by every place their file is used, so nothing about loading them is stored on them
+    # the state of each file being walked is kept in an LDrawFrame on a stack instead of the call stack
+    def load(self, **kwargs):
+        steps = self.iter_load(**kwargs)
+        while True:
+            try:
+                next(steps)
+            except StopIteration as e:
+                return e.value
+
+    # load one step at a time
+    # yields how much of this file has been loaded from 0 to 1 after every file that is finished
+    # returns what load returns
+    def iter_load(self,
+                  color_code="16",
+                  parent_matrix=None,
+                  accum_matrix=None,
+                  geometry_data=None,
+                  accum_cull=True,
+                  accum_invert=False,
+                  parent_collection=None,
+                  return_mesh=False,
+                  ):
 
-        self.current_pe_tex_path = None
-        self.current_subfile_pe_tex_path = None
-        self.pe_tex_infos = {}
-        self.subfile_pe_tex_infos = {}
-        self.pe_tex_info = []
-
-    def load(self,
-             color_code="16",
-             parent_matrix=None,
-             accum_matrix=None,
-             geometry_data=None,
-             accum_cull=True,
-             accum_invert=False,
-             parent_collection=None,
-             return_mesh=False,
-             ):
-
-        if self.file.is_edge_logo() and not ImportOptions.display_logo:
-            return
-        if self.file.is_stud() and ImportOptions.no_studs:
-            return
+        parent_matrix = parent_matrix or matrices.identity_matrix
+        accum_matrix = accum_matrix or matrices.identity_matrix
+
+        state = LoadState(
+            color_code=color_code,
+            matrix=parent_matrix,
+            determinant=parent_matrix.determinant(),
+            accum_matrix=accum_matrix,
+            accum_cull=accum_cull,
+            accum_invert=accum_invert,
+            texmap=None,
+            texmaps=(),
+            pe_tex_info=[],
+            pe_tex_infos={},
+            geometry_data=geometry_data,
+            collection=parent_collection,
+        )
+
+        frame = LDrawNode.__enter(self, state, return_mesh=return_mesh)
+        if frame is None:
+            return None
+
+        part_total = 1
+        if self.file.is_like_model() and not self.file.is_like_part():
+            part_total = max(1, LDrawNode.get_part_count(self.file))
+        part_start = LDrawNode.part_count
+
+        result = None
+        for result in LDrawNode.__iter_walk(frame):
+            yield min((LDrawNode.part_count - part_start) / part_total, 1.0)
+        LDrawNode.bounds = frame.bounds
+        return result
+
+    # returns what finishing frame returned
+    @staticmethod
+    def __walk(frame):
+        result = None
+        for result in LDrawNode.__iter_walk(frame):
+            pass
+        return result
+
+    # walk every file under frame depth first
+    # when a subfile has to be walked, a frame for it is pushed and the parent continues once it is popped
+    # yields what finishing each frame returned, frame is the last one finished
+    @staticmethod
+    def __iter_walk(frame):
+        stack = [frame]
+        while len(stack) > 0:
+            frame = stack[-1]
+            if frame.placed_frames is not None:
+                child_frame = next(frame.placed_frames, None)
+                if child_frame is not None:
+                    stack.append(child_frame)
+                    continue
+
+            child_node = next(frame.child_nodes, None)
+            if child_node is not None:
+                child_frame = LDrawNode.__load_child_node(frame, child_node)
+                if child_frame is not None:
+                    stack.append(child_frame)
+                continue
+
+            stack.pop()
+            result = LDrawNode.__finish(frame)
+            if len(stack) > 0:
+                stack[-1].bounds = matrices.merge_bounds(stack[-1].bounds, frame.bounds)
+                LDrawNode.__end_subfile_line(stack[-1], frame.node)
+                LDrawNode.__end_child_node(stack[-1], frame.node)
+            yield result
+
+    # build the frame that loads ldraw_node with state
+    # returns None if ldraw_node is skipped
+    # placed_matrix is the object matrix of a part that is placed from its model's placements
+    @staticmethod
+    def __enter(ldraw_node, state, return_mesh=False, placed_matrix=None):
+        if ldraw_node.__is_skipped():
+            return None
 
-        LDrawNode.current_filename = self.file.name
+        LDrawNode.current_filename = ldraw_node.file.name
 
         # keep track of the matrix and color up to this point
         # parent_matrix is the previous level's transform
         # current_matrix is the matrix up to this point and used for placement of objects
         # accum_matrix is every transform up to this point
         # child_matrix is what is used to tranform this level and set the parent transform of the next level
-        parent_matrix = parent_matrix or matrices.identity_matrix
-        accum_matrix = accum_matrix or matrices.identity_matrix
+        parent_matrix = state.matrix
+        accum_matrix = state.accum_matrix
 
-        if self.is_root:
-            self.matrix = self.matrix @ matrices.rotation_matrix
+        matrix = ldraw_node.matrix
+        if ldraw_node.is_root:
+            matrix = matrix @ matrices.rotation_matrix
 
-        current_matrix = parent_matrix @ self.matrix
+        current_matrix = parent_matrix @ matrix
         child_accum_matrix = accum_matrix @ current_matrix
         child_matrix = current_matrix
 
         # current_color_code is the color_code up to this point
-        current_color_code = color_code
+        current_color_code = state.color_code
+
+        geometry_data = state.geometry_data
+        accum_cull = state.accum_cull
+        accum_invert = state.accum_invert
 
         # when a part is used on its own and also treated as a subpart like with a shortcut, the part will not render in the shortcut
         # obj_key is essentially a list of attributes that are unique to parts that share the same file
         # texmap parts are defined as parts so it should be safe to exclude that from the key
         # pe_tex_info is defined like an mpd so mutliple instances sharing the same part name will share the same texture unless it is included in the key
         # the only thing unique about a geometry_data object is its filename and whether it has pe_tex_info
-        geometry_data_key = LDrawNode.__build_key(self.file.name, color_code=current_color_code, pe_tex_info=self.pe_tex_info)
+        # the color isn't part of it because faces that take the part's color keep color code 16
+        # so every color of a part shares one geometry_data and only gets its own mesh
+        geometry_data_key = LDrawNode.__build_key(ldraw_node.file.name, pe_tex_info=state.pe_tex_info)
+        mesh_key = LDrawNode.__build_key(ldraw_node.file.name, color_code=current_color_code, pe_tex_info=state.pe_tex_info)
 
         # if there's no geometry_data and some part type, it's a top level part so start collecting geometry
         # there are occasions where files with part_type of model have geometry so you can't rely on its part_type
@@ -109,203 +302,646 @@ class LDrawNode:
         # TODO: is_shortcut_model splits 99141c01.dat and u9158.dat into its subparts -
         #  u9158.dat - ensure the battery contacts are correct
 
-        top_part = geometry_data is None and self.file.is_like_part()
-        top_model = geometry_data is None and self.file.is_like_model()
+        top_part = geometry_data is None and ldraw_node.file.is_like_part()
+        top_model = geometry_data is None and ldraw_node.file.is_like_model()
 
-        merge_model = self.file.name == "10261 - candyflosscart.ldr"
+        merge_model = ldraw_node.file.name == "10261 - candyflosscart.ldr"
         merge_model = False
         merge_model = top_model and merge_model
 
-        part_model = self.file.is_like_stud()
+        part_model = ldraw_node.file.is_like_stud()
         part_model = False
         top_part = top_part or part_model
 
+        # a part in a step that isn't imported is skipped
+        # it would have ended a group_nxt, so that still has to happen
+        if top_part and not ldraw_meta.is_step_imported():
+            if group.end_next_collection:
+                group.next_collection = None
+            return None
+
+        part_file = ldraw_node.file
+        hidden_studs = ()
         if top_part:
             LDrawNode.part_count += 1
-            geometry_data = LDrawNode.geometry_datas.get(geometry_data_key)
-            current_matrix = current_matrix @ matrices.reverse_rotation_matrix
-            # clean up floating point errors
-            for i in range(len(current_matrix)):
-                for j in range(len(current_matrix[i])):
-                    current_matrix[i][j] = round(current_matrix[i][j], 6)
-                    print(current_matrix[i][j])
+            if placed_matrix is not None:
+                current_matrix = placed_matrix
+            else:
+                current_matrix = current_matrix @ matrices.reverse_rotation_matrix
+                # clean up floating point errors
+                for i in range(len(current_matrix)):
+                    for j in range(len(current_matrix[i])):
+                        current_matrix[i][j] = round(current_matrix[i][j], 6)
+                        print(current_matrix[i][j])
             child_matrix = matrices.identity_matrix
+
+            # a part with other primitives than the search paths' resolution has its own geometry_data
+            if part_lod.is_used():
+                part_file = part_lod.get_part_file(ldraw_node.file, current_matrix)
+
+            # a part with some of its studs covered has its own geometry_data without them
+            if stud_culling.is_used():
+                hidden_studs = stud_culling.get_hidden_studs(part_file, current_matrix)
+
+            if part_file.resolution is not None or len(hidden_studs) > 0:
+                geometry_data_key = LDrawNode.__build_key(part_file.name, pe_tex_info=state.pe_tex_info, resolution=part_file.resolution, hidden_studs=hidden_studs)
+                mesh_key = LDrawNode.__build_key(part_file.name, color_code=current_color_code, pe_tex_info=state.pe_tex_info, resolution=part_file.resolution, hidden_studs=hidden_studs)
+            geometry_data = LDrawNode.geometry_datas.get(geometry_data_key)
         elif top_model:
             if merge_model:
                 geometry_data = LDrawNode.geometry_datas.get(geometry_data_key)
                 child_matrix = matrices.identity_matrix
-            LDrawNode.current_model_filename = self.file.name
+            LDrawNode.current_model_filename = ldraw_node.file.name
 
+        # creature_015_mangreengraysuitmustache.ldr is a BFC NOCERTIFY model which causes parts used by it to be NOCERTIFY everywhere
+        # reset bfc for parts since they are what define the bfc state of their geometry
+        # bfc_certified doesn't need to be reset because every frame starts with its own
         if top_model or top_part:
-            # creature_015_mangreengraysuitmustache.ldr is a BFC NOCERTIFY model which causes parts used by it to be NOCERTIFY everywhere
-            # reset bfc for parts since they are what define the bfc state of their geometry
             accum_cull = True
             accum_invert = False
-            self.bfc_certified = None
 
-        collection = parent_collection
+        collection = state.collection
         if collection is None:
             collection = group.top_collection
             if top_model:
                 collection = group.files_collection
 
         if top_model:
-            collection = group.get_filename_collection(self.file.name, collection)
+            collection = group.get_filename_collection(ldraw_node.file.name, collection)
 
         # always process geometry_data if this is a subpart or there is no geometry_data
         # if geometry_data exists, this is a top level part that has already been processed so don't process this key again
         is_top = top_part or merge_model or part_model
-        if not is_top or geometry_data is None:
-            if is_top:
+        walk = not is_top or geometry_data is None
+        if is_top:
+            current_color_code = "16"
+            if walk:
                 geometry_data = GeometryData()
 
-            local_cull = True
-            winding = "CCW"
-            invert_next = False
-
-            subfile_line_index = 0
-            for child_node in self.file.child_nodes:
-                # self.texmap_fallback will only be true if ImportOptions.meta_texmap == True and you're on a fallback line
-                # if ImportOptions.meta_texmap == False, it will always be False
-                if child_node.meta_command in ["1", "2", "3", "4", "5"] and not self.texmap_fallback:
-                    child_current_color = LDrawNode.__determine_color(color_code, child_node.color_code)
-                    if child_node.meta_command == "1":
-                        child_node.texmap = self.texmap
-
-                        # if we have no pe_tex_info, try to get one from pe_tex_infos otherwise keep using the one we have
-                        # custom minifig head > 3626tex.dat (has no pe_tex) > 3626texshell.dat
-                        if len(self.pe_tex_info) < 1:
-                            child_node.pe_tex_info = self.pe_tex_infos.get(subfile_line_index, [])
-                        else:
-                            child_node.pe_tex_info = self.pe_tex_info
-
-                        subfile_pe_tex_infos = self.subfile_pe_tex_infos.get(subfile_line_index, {})
-                        # don't replace the collection in case this file already has pe_tex_infos
-                        for k, v in subfile_pe_tex_infos.items():
-                            child_node.pe_tex_infos.setdefault(k, v)
-
-                        child_node.load(
-                            color_code=child_current_color,
-                            parent_matrix=child_matrix,
-                            accum_matrix=child_accum_matrix,
-                            geometry_data=geometry_data,
-                            accum_cull=self.bfc_certified and accum_cull and local_cull,
-                            accum_invert=(accum_invert ^ invert_next),  # xor
-                            parent_collection=collection,
-                        )
-                        # for node in child_node.load(
-                        #         color_code=child_current_color,
-                        #         parent_matrix=child_matrix,
-                        #         geometry_data=geometry_data,
-                        #         accum_cull=self.bfc_certified and accum_cull and local_cull,
-                        #         accum_invert=(accum_invert ^ invert_next),  # xor
-                        #         parent_collection=collection,
-                        # ):
-                        #     yield node
-
-                        subfile_line_index += 1
-                        ldraw_meta.meta_root_group_nxt(self, child_node)
-                    elif child_node.meta_command == "2":
-                        ldraw_meta.meta_edge(
-                            child_node,
-                            child_current_color,
-                            child_matrix,
-                            geometry_data,
-                        )
-                    elif child_node.meta_command in ["3", "4"]:
-                        _winding = None
-                        if self.bfc_certified and accum_cull and local_cull:
-                            _winding = winding
-
-                        ldraw_meta.meta_face(
-                            self,
-                            child_node,
-                            child_current_color,
-                            child_matrix,
-                            geometry_data,
-                            _winding,
-                        )
-                    elif child_node.meta_command == "5":
-                        ldraw_meta.meta_line(
-                            child_node,
-                            child_current_color,
-                            child_matrix,
-                            geometry_data,
-                        )
-                elif child_node.meta_command == "bfc":
-                    # does it make sense for models to have bfc info? maybe if that model has geometry, but then it would be treated like a part
-                    if ImportOptions.meta_bfc:
-                        local_cull, winding, invert_next = ldraw_meta.meta_bfc(self, child_node, child_matrix, local_cull, winding, invert_next, accum_invert)
-                elif child_node.meta_command == "texmap":
-                    ldraw_meta.meta_texmap(self, child_node, child_matrix)
-                elif child_node.meta_command.startswith("pe_tex_"):
-                    ldraw_meta.meta_pe_tex(self, child_node, child_matrix)
-                else:
-                    # these meta commands really only make sense if they are encountered at the model level
-                    # these should never be encoutered when geometry_data not None
-                    # so they should be processed every time they are hit
-                    # as opposed to just once because they won't be cached
-                    if child_node.meta_command == "step":
-                        ldraw_meta.meta_step()
-                    elif child_node.meta_command == "save":
-                        ldraw_meta.meta_save()
-                    elif child_node.meta_command == "clear":
-                        ldraw_meta.meta_clear()
-                    elif child_node.meta_command == "print":
-                        ldraw_meta.meta_print(child_node)
-                    elif child_node.meta_command.startswith("group"):
-                        ldraw_meta.meta_group(child_node)
-                    elif child_node.meta_command == "leocad_camera":
-                        ldraw_meta.meta_leocad_camera(child_node, child_matrix)
-
-                if self.texmap_next:
-                    ldraw_meta.set_texmap_end(self)
-
-                if child_node.meta_command != "bfc":
-                    invert_next = False
-                elif child_node.meta_command == "bfc" and child_node.meta_args["command"] != "INVERTNEXT":
-                    invert_next = False
+        # a model that does nothing but place parts and other models like it is not walked
+        # its parts are placed from its placements, which are only built once no matter how many times it's used
+        placed = top_model and not ldraw_node.is_root and LDrawNode.__is_placeable(ldraw_node.file, state)
+        if placed:
+            walk = False
 
-        if is_top:
-            # geometry_data will not be None if this is a new mesh
-            # geometry_data will be None if the mesh already exists
-            if geometry_data_key not in LDrawNode.geometry_datas and geometry_data is not None:
-                geometry_data.key = geometry_data_key
-                geometry_data.file = self.file
-                geometry_data.bfc_certified = self.bfc_certified
-                LDrawNode.geometry_datas[geometry_data_key] = geometry_data
-            geometry_data = LDrawNode.geometry_datas[geometry_data_key]
+        obj_matrix = current_matrix
 
+        if part_model:
+            obj_matrix = ldraw_node.matrix
+            obj_matrix = parent_matrix
             obj_matrix = current_matrix
+            obj_matrix = child_matrix
+            obj_matrix = accum_matrix @ ldraw_node.matrix
+
+        frame = LDrawFrame(ldraw_node, state._replace(
+            color_code=current_color_code,
+            matrix=child_matrix,
+            determinant=child_matrix.determinant(),
+            accum_matrix=child_accum_matrix,
+            accum_cull=accum_cull,
+            accum_invert=accum_invert,
+            geometry_data=geometry_data,
+            collection=collection,
+        ), walk=walk, ldraw_file=part_file)
+        frame.is_top = is_top
+        frame.color_code = state.color_code
+        frame.geometry_data_key = geometry_data_key
+        frame.mesh_key = mesh_key
+        frame.hidden_studs = hidden_studs
+        frame.obj_matrix = obj_matrix
+        frame.return_mesh = return_mesh
+        frame.is_model = top_model
+
+        if placed:
+            frame.placed_frames = LDrawNode.__iter_placed_frames(frame)
+        return frame
+
+    # the frames of every part of the model of frame from its placements
+    # the matrices of every part are composed with the model's matrix at once
+    # each part frame is walked before the next one is made
+    @staticmethod
+    def __iter_placed_frames(frame):
+        state = frame.state
+        placements = LDrawNode.get_placements(frame.file)
+
+        # each use of a model gets its own collections, like when it's walked
+        collections = []
+        for filename, parent in placements.submodels:
+            host_collection = state.collection if parent < 0 else collections[parent]
+            collections.append(group.get_filename_collection(filename, host_collection))
+
+        obj_matrices = matrices.compose_matrices(state.matrix, placements.matrices, matrices.reverse_rotation_matrix)
+        # clean up floating point errors
+        obj_matrices = np.round(obj_matrices, 6)
+
+        submodel_bounds = [None] * len(placements.submodels)
+        for ldraw_node, color_code, obj_matrix, submodel_id in zip(placements.nodes, placements.color_codes, obj_matrices.tolist(), placements.submodel_ids):
+            part_state = state._replace(
+                color_code=LDrawNode.__determine_color(state.color_code, color_code),
+                collection=state.collection if submodel_id < 0 else collections[submodel_id],
+            )
+            part_frame = LDrawNode.__enter(ldraw_node, part_state, placed_matrix=mathutils.Matrix(obj_matrix))
+            if part_frame is not None:
+                yield part_frame
+                if submodel_id >= 0:
+                    submodel_bounds[submodel_id] = matrices.merge_bounds(submodel_bounds[submodel_id], part_frame.bounds)
+
+        # submodels always come after their parent, so going backwards adds every submodel to its parent before the parent is added
+        for i in reversed(range(len(placements.submodels))):
+            filename, parent = placements.submodels[i]
+            if parent >= 0:
+                submodel_bounds[parent] = matrices.merge_bounds(submodel_bounds[parent], submodel_bounds[i])
+            LDrawNode.submodel_bounds.append((filename, collections[i], submodel_bounds[i]))
+
+    # flatten ldraw_file into the placements of every part under it
+    # only files that are models without geometry are treated as submodels, anything else used by a model is a part
+    # this doesn't depend on anything but the import options, so it's cached for the whole import
+    @staticmethod
+    def get_placements(ldraw_file):
+        placements = LDrawNode.model_placements.get(ldraw_file)
+        if placements is None:
+            nodes = []
+            color_codes = []
+            _matrices = []
+            submodel_ids = []
+            submodels = []
+            inverts = []
+            invert_next = False
+            for child_node in ldraw_file.iter_child_nodes():
+                invert = invert_next
+                invert_next = child_node.meta_command == "bfc" and child_node.meta_args["command"] == "INVERTNEXT"
+                if child_node.meta_command != "1" or child_node.__is_skipped():
+                    continue
+
+                matrix = np.array(child_node.matrix, dtype=np.float64)
+                if child_node.file.is_like_part() or not child_node.file.is_like_model():
+                    nodes.append(child_node)
+                    color_codes.append(child_node.color_code)
+                    _matrices.append(matrix[np.newaxis])
+                    submodel_ids.append(-1)
+                    inverts.append(invert)
+                    continue
+
+                # the placements of a submodel are moved under this model, and its submodels become submodels of this one
+                child_placements = LDrawNode.get_placements(child_node.file)
+                submodel_id = len(submodels)
+                submodels.append((child_node.file.name, -1))
+                for filename, parent in child_placements.submodels:
+                    submodels.append((filename, submodel_id + 1 + parent if parent >= 0 else submodel_id))
+
+                nodes.extend(child_placements.nodes)
+                for color_code in child_placements.color_codes:
+                    color_codes.append(child_node.color_code if color_code == "16" else color_code)
+                _matrices.append(matrices.compose_matrices(matrix, child_placements.matrices))
+                for child_submodel_id in child_placements.submodel_ids:
+                    submodel_ids.append(submodel_id + 1 + child_submodel_id if child_submodel_id >= 0 else submodel_id)
+                for child_invert in child_placements.inverts:
+                    inverts.append(child_invert ^ invert)  # xor
+
+            if len(_matrices) > 0:
+                _matrices = np.concatenate(_matrices)
+            else:
+                _matrices = np.zeros((0, 4, 4), dtype=np.float64)
+
+            placements = ModelPlacements(nodes, color_codes, _matrices, submodel_ids, submodels, inverts)
+            LDrawNode.model_placements[ldraw_file] = placements
+        return placements
+
+    # how many parts get_placements places for ldraw_file, counted from what was recorded about each file when it was parsed
+    # so the placements don't have to be built just to know how many there are
+    @staticmethod
+    def get_part_count(ldraw_file):
+        part_count = LDrawNode.part_counts.get(ldraw_file)
+        if part_count is None:
+            part_count = 0
+            for subfile, subfile_count in ldraw_file.subfile_counts.items():
+                if LDrawNode.__is_skipped_file(subfile):
+                    continue
+                if subfile.is_like_part() or not subfile.is_like_model():
+                    part_count += subfile_count
+                else:
+                    part_count += subfile_count * LDrawNode.get_part_count(subfile)
+            LDrawNode.part_counts[ldraw_file] = part_count
+        return part_count
 
-            if part_model:
-                obj_matrix = self.matrix
-                obj_matrix = parent_matrix
-                obj_matrix = current_matrix
-                obj_matrix = child_matrix
-                obj_matrix = accum_matrix @ self.matrix
-
-            # blender mesh data is unique also based on color
-            # this means a geometry_data for a file is created only once, but a mesh is created for every color that uses that geometry_data
-            key = geometry_data.key
-            mesh = ldraw_mesh.create_mesh(key, geometry_data, color_code, return_mesh=return_mesh)
-            if return_mesh:
-                return mesh
-            obj = ldraw_object.create_object(mesh, geometry_data, color_code, obj_matrix, collection)
-
-            if ImportOptions.import_edges:
-                edge_key = f"e_{geometry_data.key}"
-                edge_mesh = ldraw_mesh.create_edge_mesh(edge_key, geometry_data)
-                edge_obj = ldraw_object.create_edge_obj(edge_mesh, geometry_data, color_code, obj, collection)
-
+    # the state a model is used with only has to be passed on to its parts
+    # pe_tex_info is looked up by the line a subfile is on, so a model using it has to be walked
+    @staticmethod
+    def __is_placeable(ldraw_file, state):
+        if len(state.pe_tex_info) > 0 or len(state.pe_tex_infos) > 0:
+            return False
+        return LDrawNode.__is_placeable_file(ldraw_file)
+
+    # a file is placeable if it's a model whose lines only place parts and placeable models
+    # bfc doesn't matter because parts and models reset it
+    # this only looks at what was recorded about the file when it was parsed, so a streamed model isn't parsed again
+    @staticmethod
+    def __is_placeable_file(ldraw_file):
+        placeable = LDrawNode.placeable_files.get(ldraw_file)
+        if placeable is None:
+            placeable = ldraw_file.is_like_model() and not ldraw_file.is_like_part()
+            if placeable:
+                placeable = not any(meta_command != "1" and LDrawNode.__is_meta_command_used(meta_command) for meta_command in ldraw_file.meta_commands)
+            if placeable:
+                for subfile in ldraw_file.subfile_counts:
+                    if LDrawNode.__is_skipped_file(subfile):
+                        continue
+                    if subfile.is_like_part():
+                        placeable = not subfile.is_like_model()
+                    else:
+                        placeable = LDrawNode.__is_placeable_file(subfile)
+
+                    if not placeable:
+                        break
+            LDrawNode.placeable_files[ldraw_file] = placeable
+        return placeable
+
+    # whether a meta command found in a model does anything with the current import options
+    @staticmethod
+    def __is_meta_command_used(meta_command):
+        if meta_command in ["2", "3", "4", "5", "leocad_camera"] or meta_command.startswith("pe_tex_"):
+            return True
+        if meta_command == "texmap":
+            return ImportOptions.meta_texmap
+        if meta_command == "step":
+            return ImportOptions.meta_step
+        if meta_command == "save":
+            return ImportOptions.meta_save
+        if meta_command == "clear":
+            return ImportOptions.meta_clear
+        if meta_command == "print":
+            return ImportOptions.meta_print_write
+        if meta_command.startswith("group"):
+            return ImportOptions.meta_group
+        return False
+
+    # called once every child node of frame has been walked
+    # ldraw_mesh and ldraw_object need blender, so they are only imported once something is created
+    @staticmethod
+    def __finish(frame):
+        if frame.is_model:
+            LDrawNode.submodel_bounds.append((frame.file.name, frame.state.collection, frame.bounds))
+
+        if not frame.is_top:
+            return None
+
+        from . import ldraw_mesh
+        from . import ldraw_object
+
+        state = frame.state
+        geometry_data = state.geometry_data
+        geometry_data_key = frame.geometry_data_key
+
+        # geometry_data will not be None if this is a new mesh
+        # geometry_data will be None if the mesh already exists
+        if geometry_data_key not in LDrawNode.geometry_datas and geometry_data is not None:
+            geometry_data.key = geometry_data_key
+            geometry_data.file = frame.file
+            geometry_data.bfc_certified = frame.bfc_certified
+            if len(frame.hidden_studs) > 0:
+                stud_culling.remove_hidden_studs(geometry_data, frame.file, frame.hidden_studs)
+            # a part without some of its studs isn't shared since its meshes are keyed by the studs it's missing
+            if len(state.pe_tex_info) < 1 and len(frame.hidden_studs) < 1:
+                geometry_data = LDrawNode.__share_geometry_data(geometry_data)
+            LDrawNode.geometry_datas[geometry_data_key] = geometry_data
+        geometry_data = LDrawNode.geometry_datas[geometry_data_key]
+
+        # a file with the same geometry as one that was loaded before uses that one's meshes
+        mesh_key = frame.mesh_key
+        if geometry_data.file is not frame.file:
+            mesh_key = LDrawNode.__build_key(geometry_data.file.name, color_code=frame.color_code, resolution=geometry_data.file.resolution)
+
+        # blender mesh data is unique also based on color
+        # this means a geometry_data for a file is created only once, but a mesh is created for every color that uses that geometry_data
+        if frame.return_mesh:
+            return ldraw_mesh.create_mesh(mesh_key, geometry_data, frame.color_code, return_mesh=frame.return_mesh)
+
+        # meshes are rotated into blender's coordinates when they're created
+        bounds = matrices.transform_bounds(frame.obj_matrix @ matrices.rotation_matrix, geometry_data.get_bounds())
+
+        # a part that can't be seen gets no mesh or object
+        culled = LDrawNode.frustum is not None and not LDrawNode.frustum.intersects_bounds(bounds)
+        occluded = not culled and occlusion_culling.is_occluded(bounds)
+        if culled:
+            LDrawNode.culled_count += 1
+        if occluded:
+            LDrawNode.occluded_count += 1
+        if culled or occluded:
+            geometry_spill.release(geometry_data)
             if group.end_next_collection:
                 group.next_collection = None
+            return None
+
+        frame.bounds = bounds
+        mesh = ldraw_mesh.create_mesh(mesh_key, geometry_data, frame.color_code)
+
+        obj = ldraw_object.create_object(mesh, frame.file, frame.color_code, frame.obj_matrix, state.collection)
+
+        # edges don't have materials so every color shares the same edge mesh
+        if ImportOptions.import_edges:
+            edge_key = f"e_{geometry_data.key}"
+            edge_mesh = ldraw_mesh.create_edge_mesh(edge_key, geometry_data)
+            edge_obj = ldraw_object.create_edge_obj(edge_mesh, frame.file, frame.color_code, obj, state.collection)
+
+        # every mesh this geometry_data is needed for now exists
+        geometry_spill.release(geometry_data)
+
+        if group.end_next_collection:
+            group.next_collection = None
+
+        # if LDrawNode.part_count == 1:
+        #     raise BaseException("done")
+
+        return obj
+
+    # process one line of the file of frame
+    # returns a frame if child_node is a subfile that has to be walked before the next line
+    @staticmethod
+    def __load_child_node(frame, child_node):
+        state = frame.state
+
+        # frame.texmap_fallback will only be true if ImportOptions.meta_texmap == True and you're on a fallback line
+        # if ImportOptions.meta_texmap == False, it will always be False
+        if child_node.meta_command in ["1", "2", "3", "4", "5"] and not frame.texmap_fallback:
+            child_current_color = LDrawNode.__determine_color(state.color_code, child_node.color_code)
+            if child_node.meta_command == "1":
+                child_frame = LDrawNode.__load_subfile(frame, child_node, child_current_color)
+                if child_frame is not None:
+                    return child_frame
+                LDrawNode.__end_subfile_line(frame, child_node)
+            elif child_node.meta_command == "2":
+                ldraw_meta.meta_edge(
+                    child_node,
+                    child_current_color,
+                    frame.vertices,
+                    state.geometry_data,
+                )
+            elif child_node.meta_command in ["3", "4"]:
+                _winding = None
+                if frame.bfc_certified and state.accum_cull and frame.local_cull:
+                    _winding = frame.winding
+
+                ldraw_meta.meta_face(
+                    frame,
+                    child_node,
+                    child_current_color,
+                    frame.vertices,
+                    state.geometry_data,
+                    _winding,
+                )
+            elif child_node.meta_command == "5":
+                ldraw_meta.meta_line(
+                    child_node,
+                    child_current_color,
+                    frame.vertices,
+                    state.geometry_data,
+                )
+        elif child_node.meta_command == "bfc":
+            # does it make sense for models to have bfc info? maybe if that model has geometry, but then it would be treated like a part
+            if ImportOptions.meta_bfc:
+                frame.local_cull, frame.winding, frame.invert_next = ldraw_meta.meta_bfc(frame, child_node, state.determinant, frame.local_cull, frame.winding, frame.invert_next, state.accum_invert)
+        elif child_node.meta_command == "texmap":
+            ldraw_meta.meta_texmap(frame, child_node, state.matrix)
+        elif child_node.meta_command.startswith("pe_tex_"):
+            ldraw_meta.meta_pe_tex(frame, child_node, state.matrix)
+        else:
+            # these meta commands really only make sense if they are encountered at the model level
+            # these should never be encoutered when geometry_data not None
+            # so they should be processed every time they are hit
+            # as opposed to just once because they won't be cached
+            if child_node.meta_command == "step":
+                ldraw_meta.meta_step()
+            elif child_node.meta_command == "save":
+                ldraw_meta.meta_save()
+            elif child_node.meta_command == "clear":
+                ldraw_meta.meta_clear()
+            elif child_node.meta_command == "print":
+                ldraw_meta.meta_print(child_node)
+            elif child_node.meta_command.startswith("group"):
+                ldraw_meta.meta_group(child_node)
+            elif child_node.meta_command == "leocad_camera":
+                ldraw_meta.meta_leocad_camera(child_node, state.matrix)
+
+        LDrawNode.__end_child_node(frame, child_node)
+        return None
+
+    # returns the frame that walks the subfile of child_node
+    # or None if it was skipped or added from its baked geometry
+    @staticmethod
+    def __load_subfile(frame, child_node, color_code):
+        state = frame.state
+
+        # if we have no pe_tex_info, try to get one from pe_tex_infos otherwise keep using the one we have
+        # custom minifig head > 3626tex.dat (has no pe_tex) > 3626texshell.dat
+        pe_tex_info = frame.pe_tex_info
+        if len(pe_tex_info) < 1:
+            pe_tex_info = frame.pe_tex_infos.get(frame.subfile_line_index, [])
+
+        child_state = state._replace(
+            color_code=color_code,
+            accum_cull=frame.bfc_certified and state.accum_cull and frame.local_cull,
+            accum_invert=(state.accum_invert ^ frame.invert_next),  # xor
+            pe_tex_info=pe_tex_info,
+            pe_tex_infos=frame.subfile_pe_tex_infos.get(frame.subfile_line_index, {}),
+        )
+
+        # inside of a part, subfiles without texmaps are added from their baked geometry
+        # instead of walking their subfiles again
+        if state.geometry_data is not None and LDrawNode.__is_bakeable(child_node, child_state):
+            LDrawNode.__load_baked(child_node, child_state)
+            return None
+
+        return LDrawNode.__enter(child_node, child_state)
+
+    # what is done with a subfile line once its subfile has been loaded
+    @staticmethod
+    def __end_subfile_line(frame, child_node):
+        frame.subfile_line_index += 1
+        ldraw_meta.meta_root_group_nxt(frame, child_node)
+
+    # what is done after every line of a file
+    @staticmethod
+    def __end_child_node(frame, child_node):
+        if frame.texmap_next:
+            ldraw_meta.set_texmap_end(frame)
 
-            # if LDrawNode.part_count == 1:
-            #     raise BaseException("done")
+        if child_node.meta_command != "bfc":
+            frame.invert_next = False
+        elif child_node.meta_command == "bfc" and child_node.meta_args["command"] != "INVERTNEXT":
+            frame.invert_next = False
 
-            # yield obj
-            return obj
+    def __is_skipped(self):
+        return LDrawNode.__is_skipped_file(self.file)
+
+    @staticmethod
+    def __is_skipped_file(ldraw_file):
+        if ldraw_file.is_edge_logo() and not ImportOptions.display_logo:
+            return True
+        if ldraw_file.is_stud() and ImportOptions.no_studs:
+            return True
+        return False
+
+    # add this subfile's geometry to geometry_data from its baked geometry
+    # the baked geometry is in the subfile's local space, so it only has to be transformed into place
+    # the winding of a face depends on accum_invert, accum_cull and the sign of the determinant of the matrix it was
+    # transformed by, so a subfile is baked once for each combination of those that is actually used
+    def __load_baked(self, state):
+        if self.__is_skipped():
+            return
+
+        matrix = state.matrix @ self.matrix
+        determinant = state.determinant * self.matrix.determinant()
+        determinant_sign = (determinant > 0) - (determinant < 0)
+
+        baked_geometry_data = LDrawNode.__get_baked_geometry_data(self, bool(state.accum_cull), state.accum_invert, determinant_sign)
+        state.geometry_data.add_geometry_data(baked_geometry_data, matrix, state.color_code, texmap=state.texmap)
+
+    @staticmethod
+    def __get_baked_geometry_data(ldraw_node, accum_cull, accum_invert, determinant_sign):
+        key = (ldraw_node.file, accum_cull, accum_invert, determinant_sign)
+        geometry_data = LDrawNode.baked_geometry_datas.get(key)
+        if geometry_data is None:
+            geometry_data = LDrawNode.__bake(ldraw_node, accum_cull, accum_invert, determinant_sign)
+            LDrawNode.baked_geometry_datas[key] = geometry_data
+        return geometry_data
+
+    # color code 16 is kept so that the color of the subfile line can be applied when it's added to a part
+    @staticmethod
+    def __bake(ldraw_node, accum_cull, accum_invert, determinant_sign):
+        geometry_data = GeometryData()
+        frame = LDrawFrame(ldraw_node, LoadState(
+            color_code="16",
+            matrix=matrices.identity_matrix,
+            determinant=determinant_sign,
+            accum_matrix=matrices.identity_matrix,
+            accum_cull=accum_cull,
+            accum_invert=accum_invert,
+            texmap=None,
+            texmaps=(),
+            pe_tex_info=[],
+            pe_tex_infos={},
+            geometry_data=geometry_data,
+            collection=None,
+        ))
+        LDrawNode.__walk(frame)
+        geometry_data.file = ldraw_node.file
+        geometry_data.bfc_certified = frame.bfc_certified
+        return geometry_data
+
+    # texmaps and pe_tex_info are defined in the space of the part they are in,
+    # so subfiles that use them are walked every time instead of being baked
+    # model meta commands like step and group have to be processed every time they are hit, so their files aren't baked either
+    @staticmethod
+    def __is_bakeable(child_node, state):
+        if len(state.pe_tex_info) > 0 or len(state.pe_tex_infos) > 0:
+            return False
+        return LDrawNode.__is_bakeable_file(child_node.file)
+
+    @staticmethod
+    def __is_bakeable_file(ldraw_file):
+        bakeable = LDrawNode.bakeable_files.get(ldraw_file)
+        if bakeable is None:
+            bakeable = True
+            for meta_command in ldraw_file.meta_commands:
+                if meta_command == "texmap" or meta_command.startswith("pe_tex_"):
+                    bakeable = False
+                elif LDrawNode.__is_model_meta_command(meta_command):
+                    bakeable = False
+
+                if not bakeable:
+                    break
+
+            if bakeable:
+                bakeable = all(LDrawNode.__is_bakeable_file(subfile) for subfile in ldraw_file.subfile_counts)
+            LDrawNode.bakeable_files[ldraw_file] = bakeable
+        return bakeable
+
+    @staticmethod
+    def __is_model_meta_command(meta_command):
+        return meta_command in ["step", "save", "clear", "print", "leocad_camera"] or meta_command.startswith("group")
+
+    # the files of the top level parts under ldraw_node whose geometry doesn't depend on where they're used
+    # only model files are followed and parts are not walked, so this is much cheaper than load
+    # parts in a model with texmaps are left out since they could be inside of a TEXMAP block
+    @staticmethod
+    def collect_part_files(ldraw_node):
+        part_files = {}
+        if ldraw_node.file.is_like_part():
+            return []
+
+        model_files = set()
+        ldraw_files = [ldraw_node.file]
+        while len(ldraw_files) > 0:
+            ldraw_file = ldraw_files.pop()
+            if ldraw_file in model_files:
+                continue
+            model_files.add(ldraw_file)
+
+            file_part_files = []
+            for subfile in ldraw_file.subfile_counts:
+                if LDrawNode.__is_skipped_file(subfile):
+                    continue
+
+                if subfile.is_like_part():
+                    if LDrawNode.__is_bakeable_file(subfile):
+                        file_part_files.append(subfile)
+                elif subfile.is_like_model():
+                    ldraw_files.append(subfile)
+
+            if "texmap" not in ldraw_file.meta_commands:
+                for part_file in file_part_files:
+                    part_files[part_file.filename] = part_file
+        return list(part_files.values())
+
+    # the geometry_data load builds for ldraw_file as a top level part without pe_tex_info
+    # a top level part is walked in its own space with accum_cull True and accum_invert False,
+    # which is the same as baking it, so part_files from collect_part_files can be built on their own
+    # it's a new geometry_data and not the one in baked_geometry_datas since its buffers are spilled once its meshes exist
+    @staticmethod
+    def build_geometry_data(ldraw_file):
+        ldraw_node = LDrawNode()
+        ldraw_node.file = ldraw_file
+        return LDrawNode.__bake(ldraw_node, True, False, 1)
+
+    # use a geometry_data from build_geometry_data when ldraw_file is loaded as a top level part
+    @staticmethod
+    def add_geometry_data(ldraw_file, geometry_data):
+        geometry_data_key = LDrawNode.__build_key(ldraw_file.name)
+        geometry_data.key = geometry_data_key
+        geometry_data.file = ldraw_file
+        LDrawNode.geometry_datas[geometry_data_key] = LDrawNode.__share_geometry_data(geometry_data)
+
+    # the bounds of the geometry of ldraw_file as a top level part in its own space
+    # the geometry_data is built if it hasn't been yet and kept for when the part is loaded
+    @staticmethod
+    def get_part_bounds(ldraw_file):
+        geometry_data = LDrawNode.geometry_datas.get(LDrawNode.__build_key(ldraw_file.name))
+        if geometry_data is None:
+            geometry_data = LDrawNode.build_geometry_data(ldraw_file)
+            LDrawNode.add_geometry_data(ldraw_file, geometry_data)
+        return geometry_data.get_bounds()
+
+    # files that are geometrically identical, like aliases, Physical_Colour variants and renumbered moulds,
+    # share the geometry_data of the first of them that was loaded and so also its meshes
+    # materials also depend on bfc and on whether the file is a slope or cloth, so those have to match too
+    # returns the geometry_data to use in place of geometry_data
+    @staticmethod
+    def __share_geometry_data(geometry_data):
+        if not ImportOptions.share_identical_parts:
+            return geometry_data
+
+        content_hash = geometry_data.content_hash()
+        if content_hash is None:
+            return geometry_data
+
+        filename = geometry_data.file.name
+        content_key = (
+            content_hash,
+            geometry_data.bfc_certified,
+            str(special_bricks.get_part_slopes(filename)),
+            special_bricks.get_parts_cloth(filename),
+        )
+        return LDrawNode.content_geometry_datas.setdefault(content_key, geometry_data)
 
     # set the working color code to this file's
     # color code if it isn't color code 16
@@ -319,8 +955,11 @@ class LDrawNode:
     # must include matrix, so that parts that are just mirrored versions of other parts
     # such as 32527.dat (mirror of 32528.dat) will render
     @staticmethod
-    def __build_key(filename, color_code=None, pe_tex_info=None, matrix=None):
-        _key = (filename, color_code,)
+    def __build_key(filename, color_code=None, pe_tex_info=None, matrix=None, resolution=None, hidden_studs=None):
+        _key = (filename,)
+
+        if color_code is not None:
+            _key += (color_code,)
 
         if pe_tex_info is not None:
             for p in pe_tex_info:
@@ -329,6 +968,12 @@ class LDrawNode:
         if matrix is not None:
             _key += (matrix,)
 
+        if resolution is not None:
+            _key += (resolution,)
+
+        if hidden_studs:
+            _key += (hidden_studs,)
+
         str_key = str(_key)
         if len(str_key) < 60:
             return str(str_key)
@@ -22,15 +22,16 @@ def reset_caches():
 
 
 # TODO: to add rigid body - must apply scale and cannot be parented to empty
-def create_object(mesh, geometry_data, color_code, matrix, collection):
+# ldraw_file is the file the object is for, which is not the file of mesh if it's shared with another file with the same geometry
+def create_object(mesh, ldraw_file, color_code, matrix, collection):
     obj = bpy.data.objects.new(mesh.name, mesh)
-    obj[strings.ldraw_filename_key] = geometry_data.file.name
+    obj[strings.ldraw_filename_key] = ldraw_file.name
     obj[strings.ldraw_color_code_key] = color_code
 
     color = LDrawColor.get_color(color_code)
     obj.color = color.linear_color_a
 
-    ldraw_props.set_props(obj, geometry_data.file, color_code)
+    ldraw_props.set_props(obj, ldraw_file, color_code)
     __process_top_object_matrix(obj, matrix)
     __process_top_object_edges(obj)
 
@@ -40,9 +41,9 @@ def create_object(mesh, geometry_data, color_code, matrix, collection):
     return obj
 
 
-def create_edge_obj(mesh, geometry_data, color_code, obj, collection):
+def create_edge_obj(mesh, ldraw_file, color_code, obj, collection):
     edge_obj = bpy.data.objects.new(mesh.name, mesh)
-    edge_obj[strings.ldraw_filename_key] = f"{geometry_data.file.name}_edges"
+    edge_obj[strings.ldraw_filename_key] = f"{ldraw_file.name}_edges"
     edge_obj[strings.ldraw_color_code_key] = color_code
 
     color = LDrawColor.get_color(color_code)
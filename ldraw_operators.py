@@ -3,6 +3,7 @@ import os
 
 from .definitions import APP_ROOT
 from .import_options import ImportOptions
+from .ldraw_file import LDrawFile
 from . import matrices
 from . import blender_import
 
@@ -93,6 +94,16 @@ class ReimportOperator(bpy.types.Operator):
         return {'FINISHED'}
 
 
+class ClearImportCacheOperator(bpy.types.Operator):
+    """Forget the files kept from previous imports so the next import reads everything again"""
+    bl_idname = "export_ldraw.clear_import_cache"
+    bl_label = "Clear import cache"
+
+    def execute(self, context):
+        LDrawFile.reset_content_cache()
+        return {'FINISHED'}
+
+
 class RemoveBevelOperator(bpy.types.Operator):
     """Remove bevel modifier from selected objects"""
     bl_idname = "export_ldraw.remove_bevel"
@@ -426,6 +437,7 @@ classesToRegister = [
     SnapToBrickOperator,
     SnapToPlateOperator,
     ReimportOperator,
+    ClearImportCacheOperator,
     RemoveBevelOperator,
     AddBevelOperator,
     AddEdgeSplitOperator,
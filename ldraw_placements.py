@@ -0,0 +1,58 @@
+from collections import namedtuple
+
+import numpy as np
+
+from .filesystem import FileSystem
+from .ldraw_color import LDrawColor
+from .ldraw_file import LDrawFile
+from .ldraw_node import LDrawNode
+
+# every part a model places, one row per part
+# filenames and color_codes are the file of each part and its color with color code 16 resolved
+# matrices is an (n, 4, 4) array of where each part is in the space of the model in LDraw coordinates
+# submodel_paths is the path from the model to the submodel each part is in, separated by /
+# inverts is whether each part is under an odd number of BFC INVERTNEXT along the way
+PlacementTable = namedtuple("PlacementTable", "filenames color_codes matrices submodel_paths inverts")
+
+
+# resolve the model at filepath into the placement of every part in it
+# this only reads files, blender isn't needed and no geometry is built
+# the settings of FileSystem, LDrawColor and ImportOptions are used as they are, see ImportSettings.apply_settings
+# images embedded in !DATA blocks need blender, so ImportOptions.meta_texmap should be False if those files are read
+def build_placement_table(filepath, color_code="16"):
+    FileSystem.reset_caches()
+    LDrawColor.reset_caches()
+    LDrawFile.reset_caches()
+    LDrawNode.reset_caches()
+
+    FileSystem.build_search_paths(parent_filepath=filepath)
+    LDrawFile.read_color_table()
+
+    ldraw_file = LDrawFile.get_file(filepath)
+    if ldraw_file is None:
+        return None
+
+    # a part on its own is placed once where it is
+    if ldraw_file.is_like_part() or not ldraw_file.is_like_model():
+        return PlacementTable(
+            filenames=np.array([ldraw_file.name], dtype=str),
+            color_codes=np.array([color_code], dtype=str),
+            matrices=np.identity(4, dtype=np.float64)[np.newaxis],
+            submodel_paths=np.array([ldraw_file.name], dtype=str),
+            inverts=np.zeros(1, dtype=bool),
+        )
+
+    placements = LDrawNode.get_placements(ldraw_file)
+
+    submodel_paths = []
+    for filename, parent in placements.submodels:
+        parent_path = ldraw_file.name if parent < 0 else submodel_paths[parent]
+        submodel_paths.append(f"{parent_path}/{filename}")
+
+    return PlacementTable(
+        filenames=np.array([ldraw_node.file.name for ldraw_node in placements.nodes], dtype=str),
+        color_codes=np.array([color_code if c == "16" else c for c in placements.color_codes], dtype=str),
+        matrices=placements.matrices.copy(),
+        submodel_paths=np.array([ldraw_file.name if i < 0 else submodel_paths[i] for i in placements.submodel_ids], dtype=str),
+        inverts=np.array(placements.inverts, dtype=bool),
+    )
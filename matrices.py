@@ -1,6 +1,7 @@
 import mathutils
 
 import math
+import numpy as np
 
 from .import_options import ImportOptions
 
@@ -24,3 +25,47 @@ def reset_caches():
 
     import_scale_matrix = mathutils.Matrix.Scale(ImportOptions.import_scale, 4).freeze()
     gap_scale_matrix = mathutils.Matrix.Scale(ImportOptions.gap_scale, 4).freeze()
+
+
+# transform an (n, 3) array of vertices by a 4x4 matrix with one multiply
+def transform_vertices(matrix, vertices):
+    if matrix is identity_matrix:
+        return vertices
+    _matrix = np.array(matrix, dtype=np.float64)
+    return vertices @ _matrix[:3, :3].T + _matrix[:3, 3]
+
+
+# multiply an (n, 4, 4) array of matrices by matrix on the left and right_matrix on the right
+# every matrix is composed with one multiply
+def compose_matrices(matrix, _matrices, right_matrix=None):
+    _matrices = np.array(matrix, dtype=np.float64) @ _matrices
+    if right_matrix is not None:
+        _matrices = _matrices @ np.array(right_matrix, dtype=np.float64)
+    return _matrices
+
+
+# the axis aligned bounds of bounds after being transformed by matrix
+# bounds is a (2, 3) array of min and max, or None for no bounds
+def transform_bounds(matrix, bounds):
+    if bounds is None:
+        return None
+    _matrix = np.array(matrix, dtype=np.float64)
+    center = (bounds[0] + bounds[1]) / 2
+    extent = (bounds[1] - bounds[0]) / 2
+    center = _matrix[:3, :3] @ center + _matrix[:3, 3]
+    extent = np.abs(_matrix[:3, :3]) @ extent
+    return np.array([center - extent, center + extent])
+
+
+def merge_bounds(bounds, other_bounds):
+    if bounds is None:
+        return other_bounds
+    if other_bounds is None:
+        return bounds
+    return np.array([np.minimum(bounds[0], other_bounds[0]), np.maximum(bounds[1], other_bounds[1])])
+
+
+def bounds_diagonal(bounds):
+    if bounds is None:
+        return 0.0
+    return float(np.linalg.norm(bounds[1] - bounds[0]))
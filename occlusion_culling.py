@@ -0,0 +1,142 @@
+import numpy as np
+
+from .import_options import ImportOptions
+from .ldraw_color import LDrawColor
+from . import matrices
+
+# a part is occluded if every cell around it is inside of the model, so it can't be seen from anywhere outside
+# the space of the model is split into cells on the LDraw grid, a stud wide and a plate tall
+# a cell is solid if the bounds of an opaque part cover all of it, so studs sticking out of a part don't fill a cell
+# the cells outside are the cells that aren't solid and can be reached from the edge of the grid without going through a solid one
+# parts are boxes as far as this is concerned, so this is only right for builds of mostly bricks and plates like sculptures and mosaics
+# only the parts under the root model are looked at, see build_grid
+
+# the size of a cell in LDraw units
+cell_size = (20, 8, 20)
+# how far the bounds of a part can be from the edge of a cell and still be on it
+tolerance = 0.01
+
+# (x, y, z) array of whether each cell is outside, None if nothing is occluded
+exterior = None
+# the cell of exterior[0, 0, 0]
+origin = None
+# cell_size in the space parts are placed in
+size = None
+
+
+def reset_caches():
+    global exterior
+    global origin
+    global size
+
+    exterior = None
+    origin = None
+    size = None
+
+
+def is_used():
+    return ImportOptions.occlusion_culling
+
+
+# fill the grid with every part placed by ldraw_file
+# positions are in the space parts are placed in by load, which is LDraw's space rotated into blender's
+# color_code is what color code 16 is for the parts of the root model
+def build_grid(ldraw_file, color_code="16"):
+    global exterior
+    global origin
+    global size
+
+    from .ldraw_node import LDrawNode
+
+    if ldraw_file.is_like_part() or not ldraw_file.is_like_model():
+        return
+
+    placements = LDrawNode.get_placements(ldraw_file)
+    if len(placements.nodes) < 1:
+        return
+
+    rotation = np.array(matrices.rotation_matrix, dtype=np.float64)
+    size = np.round(np.abs(rotation[:3, :3]) @ np.array(cell_size, dtype=np.float64), 6)
+
+    all_bounds = []
+    opaque = []
+    for ldraw_node, matrix, part_color_code in zip(placements.nodes, placements.matrices, placements.color_codes):
+        bounds = matrices.transform_bounds(rotation @ matrix, LDrawNode.get_part_bounds(ldraw_node.file))
+        if bounds is None:
+            continue
+        all_bounds.append(bounds)
+
+        # parts can be seen through transparent parts, so those don't fill anything
+        if part_color_code == "16":
+            part_color_code = color_code
+        color = LDrawColor.get_color(part_color_code)
+        opaque.append(color.alpha is None or color.alpha >= 1)
+
+    if len(all_bounds) < 1:
+        return
+
+    all_bounds = np.array(all_bounds, dtype=np.float64)
+    # one empty cell all the way around so every edge of the grid is outside
+    origin = np.floor(all_bounds[:, 0].min(axis=0) / size).astype(int) - 1
+    shape = np.ceil(all_bounds[:, 1].max(axis=0) / size).astype(int) - origin + 1
+
+    solid = np.zeros(shape, dtype=bool)
+    for bounds, is_opaque in zip(all_bounds, opaque):
+        if not is_opaque:
+            continue
+        cells = bounds / size - origin
+        lo = np.ceil(cells[0] - tolerance / size).astype(int)
+        hi = np.floor(cells[1] + tolerance / size).astype(int)
+        if np.all(hi > lo):
+            solid[lo[0]:hi[0], lo[1]:hi[1], lo[2]:hi[2]] = True
+
+    exterior = __flood_fill(solid)
+
+
+# whether bounds, a (2, 3) array of min and max in the space parts are placed in, is inside of the model with nothing outside next to it
+# the cells bounds is on and every cell next to those have to be inside for it to be occluded
+def is_occluded(bounds):
+    if exterior is None or bounds is None:
+        return False
+
+    cells = bounds / size - origin
+    lo = np.floor(cells[0] + tolerance / size).astype(int)
+    hi = np.maximum(np.ceil(cells[1] - tolerance / size).astype(int), lo + 1)
+    lo -= 1
+    hi += 1
+
+    # anything off of the grid is outside
+    if np.any(lo < 0) or np.any(hi > exterior.shape):
+        return False
+
+    return not np.any(exterior[lo[0]:hi[0], lo[1]:hi[1], lo[2]:hi[2]])
+
+
+# every cell that isn't solid and can be reached from the edge of the grid
+# a breadth first search where each step only looks at the cells next to the ones reached by the step before,
+# so every cell is only visited once no matter how big the grid is
+# the grid is padded with solid cells so the cells next to a cell are always the same offsets away in the flattened grid
+def __flood_fill(solid):
+    padded = np.ones(np.array(solid.shape) + 2, dtype=bool)
+    padded[1:-1, 1:-1, 1:-1] = solid
+    open_cells = ~padded.ravel()
+    strides = np.array([padded.shape[1] * padded.shape[2], padded.shape[2], 1])
+    offsets = np.concatenate([strides, -strides])
+
+    edge = np.zeros(padded.shape, dtype=bool)
+    edge[1:-1, 1:-1, 1:-1] = True
+    edge[2:-2, 2:-2, 2:-2] = False
+    frontier = np.flatnonzero(edge.ravel() & open_cells)
+
+    reached = np.zeros(open_cells.shape, dtype=bool)
+    reached[frontier] = True
+    # which entry of the new frontier claimed each cell, so a cell reached from more than one side is only added once
+    claims = np.zeros(open_cells.shape, dtype=np.int64)
+    while len(frontier) > 0:
+        neighbors = (frontier[:, None] + offsets).ravel()
+        neighbors = neighbors[open_cells[neighbors] & ~reached[neighbors]]
+        order = np.arange(len(neighbors))
+        claims[neighbors] = order
+        frontier = neighbors[claims[neighbors] == order]
+        reached[frontier] = True
+    return reached.reshape(padded.shape)[1:-1, 1:-1, 1:-1]
@@ -200,6 +200,20 @@ class IMPORT_OT_do_ldraw_import(bpy.types.Operator):
         **ImportSettings.settings_dict('meta_step_groups'),
     )
 
+    first_step: bpy.props.IntProperty(
+        name="First step",
+        description="Only import the parts of this step and the ones after it. Only used with STEP",
+        **ImportSettings.settings_dict('first_step'),
+        min=1,
+    )
+
+    last_step: bpy.props.IntProperty(
+        name="Last step",
+        description="Only import the parts of this step and the ones before it, 0 is the last step. Only used with STEP",
+        **ImportSettings.settings_dict('last_step'),
+        min=0,
+    )
+
     meta_clear: bpy.props.BoolProperty(
         name="CLEAR",
         description="Process CLEAR meta command",
@@ -264,6 +278,82 @@ class IMPORT_OT_do_ldraw_import(bpy.types.Operator):
         **ImportSettings.settings_dict('treat_shortcut_as_model'),
     )
 
+    camera_culling: bpy.props.BoolProperty(
+        name="Camera culling",
+        description="Only import parts that can be seen by a LeoCAD camera of the model",
+        **ImportSettings.settings_dict('camera_culling'),
+    )
+
+    culling_camera: bpy.props.StringProperty(
+        name="Culling camera",
+        description="Name of the camera to cull to and to measure part level of detail from. The first camera is used if this is empty",
+        **ImportSettings.settings_dict('culling_camera'),
+    )
+
+    procedural_primitives: bpy.props.BoolProperty(
+        name="Procedural primitives",
+        description="Generate cylinders, discs, edges, rings, cones and studs instead of reading them from the library",
+        **ImportSettings.settings_dict('procedural_primitives'),
+    )
+
+    primitive_segments: bpy.props.IntProperty(
+        name="Primitive segments",
+        description="How many segments a whole circle of a procedural primitive has. High resolution primitives have three times as many and low resolution primitives half as many",
+        **ImportSettings.settings_dict('primitive_segments'),
+        min=3,
+    )
+
+    part_lod: bpy.props.BoolProperty(
+        name="Part level of detail",
+        description="Choose the primitive resolution of each part by its size, and by its distance from the culling camera if the model has one",
+        **ImportSettings.settings_dict('part_lod'),
+    )
+
+    lod_low_size: bpy.props.FloatProperty(
+        name="Low detail size (LDU)",
+        description="Parts smaller than this use low resolution primitives",
+        **ImportSettings.settings_dict('lod_low_size'),
+        min=0.0,
+    )
+
+    lod_high_size: bpy.props.FloatProperty(
+        name="High detail size (LDU)",
+        description="Parts bigger than this use high resolution primitives",
+        **ImportSettings.settings_dict('lod_high_size'),
+        min=0.0,
+    )
+
+    occlusion_culling: bpy.props.BoolProperty(
+        name="Occlusion culling",
+        description="Don't import parts that are completely enclosed by other parts. Parts are treated as boxes, so this is meant for solid builds like sculptures and mosaics",
+        **ImportSettings.settings_dict('occlusion_culling'),
+    )
+
+    hide_covered_studs: bpy.props.BoolProperty(
+        name="Hide covered studs",
+        description="Don't import studs that have another part on top of them",
+        **ImportSettings.settings_dict('hide_covered_studs'),
+    )
+
+    share_identical_parts: bpy.props.BoolProperty(
+        name="Share identical parts",
+        description="Parts with different filenames but the same geometry, like aliases and renumbered moulds, share one mesh",
+        **ImportSettings.settings_dict('share_identical_parts'),
+    )
+
+    parallel_parts: bpy.props.BoolProperty(
+        name="Build parts in parallel",
+        description="Build the geometry of unique parts in separate processes. Linux only, ignored on Windows and macOS",
+        **ImportSettings.settings_dict('parallel_parts'),
+    )
+
+    geometry_memory_limit: bpy.props.IntProperty(
+        name="Geometry memory limit (MB)",
+        description="How much part geometry to keep in memory once its meshes are built. The rest is moved to disk and only read back if a mesh has to be rebuilt",
+        **ImportSettings.settings_dict('geometry_memory_limit'),
+        min=0,
+    )
+
     recalculate_normals: bpy.props.BoolProperty(
         name="Recalculate normals",
         description="Recalculate normals. Not recommended if BFC processing is active",
@@ -319,38 +409,64 @@ class IMPORT_OT_do_ldraw_import(bpy.types.Operator):
         ImportSettings.load_settings()
         return {'RUNNING_MODAL'}
 
-    # _timer = None
-    # __i = 0
-    #
-    # def modal(self, context, event):
-    #     if event.type in {'RIGHTMOUSE', 'ESC'}:
-    #         self.cancel(context)
-    #         return {'CANCELLED'}
-    #
-    #     if event.type == 'TIMER':
-    #         try:
-    #             for i in range(10000):
-    #                 next(self.__i)
-    #         except StopIteration as e:
-    #             self.cancel(context)
-    #
-    #     return {'PASS_THROUGH'}
-    #
-    # def cancel(self, context):
-    #     wm = context.window_manager
-    #     wm.event_timer_remove(self._timer)
+    _timer = None
+    _steps = None
+    _start = 0
+
+    # how long each timer tick works on the import before blender gets control back
+    __time_slice = 0.1
+
+    def modal(self, context, event):
+        if event.type == 'ESC':
+            self.cancel(context)
+            self.report({'INFO'}, "Import cancelled")
+            return {'CANCELLED'}
+
+        if event.type != 'TIMER' or event.timer != self._timer:
+            return {'PASS_THROUGH'}
+
+        phase = None
+        progress = 0.0
+        tick_end = time.perf_counter() + self.__time_slice
+        try:
+            while time.perf_counter() < tick_end:
+                phase, progress = next(self._steps)
+        except StopIteration:
+            self.__end(context)
+            self.__print_complete()
+            return {'FINISHED'}
+        except Exception as e:
+            # clean up like a cancelled import so the timer and progress don't outlive it
+            import traceback
+            print(traceback.format_exc())
+            self.__end(context)
+            self.report({'ERROR'}, f"Import failed: {e}")
+            return {'CANCELLED'}
+
+        context.window_manager.progress_update(progress * 100)
+        context.workspace.status_text_set(f"{phase}: {progress * 100:.0f}%")
+        return {'RUNNING_MODAL'}
+
+    def cancel(self, context):
+        self.__end(context)
+
+    def __end(self, context):
+        if self._steps is not None:
+            self._steps.close()
+            self._steps = None
+
+        wm = context.window_manager
+        if self._timer is not None:
+            wm.event_timer_remove(self._timer)
+            self._timer = None
+        wm.progress_end()
+        context.workspace.status_text_set(None)
 
     def execute(self, context):
-        start = time.perf_counter()
+        self._start = time.perf_counter()
 
         # bpy.ops.object.mode_set(mode='OBJECT')
 
-        # wm = context.window_manager
-        # self._timer = wm.event_timer_add(0.01, window=context.window)
-        # wm.modal_handler_add(self)
-        # self.__i = blender_import.do_import(bpy.path.abspath(self.filepath))
-        # return {'RUNNING_MODAL'}
-
         # https://docs.python.org/3/library/profile.html
         if self.profile:
             import cProfile
@@ -365,21 +481,33 @@ class IMPORT_OT_do_ldraw_import(bpy.types.Operator):
             stats.sort_stats(pstats.SortKey.TIME)
             stats.print_stats()
             stats.dump_stats(filename=prof_output)
-        else:
+        elif bpy.app.background or context.window is None:
             blender_import.do_import(bpy.path.abspath(self.filepath))
+        else:
+            # import a little at a time on a timer so blender stays responsive and the import can be cancelled with escape
+            wm = context.window_manager
+            self._steps = blender_import.iter_import(bpy.path.abspath(self.filepath))
+            self._timer = wm.event_timer_add(0.01, window=context.window)
+            wm.progress_begin(0, 100)
+            wm.modal_handler_add(self)
+            return {'RUNNING_MODAL'}
+
+        self.__print_complete()
+        return {'FINISHED'}
 
+    def __print_complete(self):
         print("")
         print("======Import Complete======")
         print(self.filepath)
         print(f"Part count: {LDrawNode.part_count}")
+        print(f"Culled count: {LDrawNode.culled_count}")
+        print(f"Occluded count: {LDrawNode.occluded_count}")
         end = time.perf_counter()
-        elapsed = (end - start)
+        elapsed = (end - self._start)
         print(f"elapsed: {elapsed}")
         print("===========================")
         print("")
 
-        return {'FINISHED'}
-
     # https://docs.blender.org/api/current/bpy.types.UILayout.html
     def draw(self, context):
         space_factor = 0.3
@@ -403,6 +531,11 @@ class IMPORT_OT_do_ldraw_import(bpy.types.Operator):
         col.prop(self, "case_sensitive_filesystem")
         col.prop(self, "use_alt_colors")
         col.prop(self, "resolution")
+        col.prop(self, "procedural_primitives")
+        col.prop(self, "primitive_segments")
+        col.prop(self, "part_lod")
+        col.prop(self, "lod_low_size")
+        col.prop(self, "lod_high_size")
         col.prop(self, "display_logo")
         col.prop(self, "chosen_logo")
         col.prop(self, "use_freestyle_edges")
@@ -433,6 +566,8 @@ class IMPORT_OT_do_ldraw_import(bpy.types.Operator):
         col.prop(self, "meta_print_write")
         col.prop(self, "meta_step")
         col.prop(self, "meta_step_groups")
+        col.prop(self, "first_step")
+        col.prop(self, "last_step")
         col.prop(self, "frames_per_step")
         col.prop(self, "set_end_frame")
         col.prop(self, "meta_clear")
@@ -456,6 +591,13 @@ class IMPORT_OT_do_ldraw_import(bpy.types.Operator):
         col.prop(self, "import_edges")
         col.prop(self, "treat_shortcut_as_model")
         col.prop(self, "no_studs")
+        col.prop(self, "hide_covered_studs")
+        col.prop(self, "camera_culling")
+        col.prop(self, "culling_camera")
+        col.prop(self, "occlusion_culling")
+        col.prop(self, "share_identical_parts")
+        col.prop(self, "parallel_parts")
+        col.prop(self, "geometry_memory_limit")
 
 
 def build_import_menu(self, context):
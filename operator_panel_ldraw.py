@@ -81,6 +81,7 @@ class CO_PT_ldraw_eo_panel(bpy.types.Panel):
         col.operator(ldraw_operators.SnapToBrickOperator.bl_idname)
         col.operator(ldraw_operators.SnapToPlateOperator.bl_idname)
         col.operator(ldraw_operators.ResetGridOperator.bl_idname)
+        col.operator(ldraw_operators.ClearImportCacheOperator.bl_idname)
 
         if not do_poll(context):
             return
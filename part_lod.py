@@ -0,0 +1,65 @@
+import numpy as np
+
+from .import_options import ImportOptions
+from . import matrices
+
+# each part gets the primitive resolution that fits how big it is, see FileSystem.resolution_choices
+# parts smaller than lod_low_size use low resolution primitives and parts bigger than lod_high_size use high resolution primitives
+# with a camera, a part's size is scaled by how much further or closer it is than what the camera is pointed at
+# so a part twice as far away as the camera's target is treated as half its size
+
+# where the camera is and how far away it is pointed, in the space parts are placed in, None if there's no camera
+camera_position = None
+target_distance = None
+
+
+def reset_caches():
+    global camera_position
+    global target_distance
+
+    camera_position = None
+    target_distance = None
+
+
+def is_used():
+    return ImportOptions.part_lod
+
+
+# camera is an LDrawCamera in the space parts are placed in
+def set_camera(camera):
+    global camera_position
+    global target_distance
+
+    camera_position = np.array(camera.position, dtype=np.float64)
+    target_distance = np.linalg.norm(np.array(camera.target_position, dtype=np.float64) - camera_position)
+
+
+# the resolution of the primitives of ldraw_file placed with obj_matrix, None for the resolution of the search paths
+def get_resolution(ldraw_file, obj_matrix):
+    from .ldraw_node import LDrawNode
+
+    # meshes are rotated into blender's coordinates when they're created, so parts are placed with obj_matrix @ rotation_matrix
+    bounds = matrices.transform_bounds(obj_matrix @ matrices.rotation_matrix, LDrawNode.get_part_bounds(ldraw_file))
+    if bounds is None:
+        return None
+
+    size = matrices.bounds_diagonal(bounds)
+    if camera_position is not None:
+        distance = np.linalg.norm((bounds[0] + bounds[1]) / 2 - camera_position)
+        size *= target_distance / max(distance, 1)
+
+    if size < ImportOptions.lod_low_size:
+        return "Low"
+    if size > ImportOptions.lod_high_size:
+        return "High"
+    return None
+
+
+# ldraw_file with the primitives of the resolution it gets when placed with obj_matrix
+def get_part_file(ldraw_file, obj_matrix):
+    from .ldraw_file import LDrawFile
+
+    resolution = get_resolution(ldraw_file, obj_matrix)
+    if resolution is None:
+        return ldraw_file
+    return LDrawFile.get_file(ldraw_file.filename, resolution=resolution)
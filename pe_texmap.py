@@ -19,40 +19,34 @@ class PETexmap:
 
     def uv_unwrap_face(self, bm, face):
         uv_layer = bm.loops.layers.uv.verify()
+        for loop, uv in zip(face.loops, self.face_uvs([loop.vert.co for loop in face.loops])):
+            loop[uv_layer].uv = uv
+
+    # the uv of each vertex of a face
+    # a vertex that is in the face more than once gets the uv of the first one
+    def face_uvs(self, vertices):
         uvs = {}
-        for i, loop in enumerate(face.loops):
-            p = loop.vert.co.copy().freeze()
+        face_uvs = []
+        for i, vertex in enumerate(vertices):
+            p = tuple(vertex)
             if p not in uvs:
                 uvs[p] = self.uvs[i]
-            loop[uv_layer].uv = uvs[p]
+            face_uvs.append(uvs[p])
+        return face_uvs
 
     @staticmethod
-    def build_pe_texmap(ldraw_node, child_node):
+    def build_pe_texmap(ldraw_frame, child_node):
         # child_node is a 3 or 4 line
-        clean_line = child_node.line
-        _params = clean_line.split()[2:]
-
-        vert_count = len(child_node.vertices)
-
+        # its uvs were parsed with the file, so all that's left is to pick the texture
+        # the last pe_tex_info is the one that's used
         pe_texmap = None
-        for p in ldraw_node.pe_tex_info:
+        for p in ldraw_frame.pe_tex_info:
             # if we have uv data and a pe_tex_info, otherwise pass
             # # custom minifig head > 3626tex.dat (has no pe_tex) > 3626texpole.dat (has no uv data)
-            if len(_params) == 15:  # use uvs provided in file
+            if child_node.uvs is not None:  # use uvs provided in file
                 pe_texmap = PETexmap()
                 pe_texmap.texture = p.image
-
-                for i in range(vert_count):
-                    if vert_count == 3:
-                        x = round(float(_params[i * 2 + 9]), 3)
-                        y = round(float(_params[i * 2 + 10]), 3)
-                        uv = mathutils.Vector((x, y))
-                        pe_texmap.uvs.append(uv)
-                    elif vert_count == 4:
-                        x = round(float(_params[i * 2 + 11]), 3)
-                        y = round(float(_params[i * 2 + 12]), 3)
-                        uv = mathutils.Vector((x, y))
-                        pe_texmap.uvs.append(uv)
+                pe_texmap.uvs = child_node.uvs
             else:
                 continue
                 # TODO: calculate uvs
@@ -67,7 +61,7 @@ class PETexmap:
                 if face_normal.dot(texture_normal) < 1.0 / 1000.0:
                     face_normal_within_texture_normal = False
 
-                for i in range(vert_count):
+                for i in range(len(child_node.vertices)):
                     # if face is within p.boundingbox
                     vert = child_node.vertices[i]
                     # is_intersecting = (p.matrix @ p.bounding_box).interects(vert)
@@ -0,0 +1,151 @@
+import math
+import re
+
+import numpy as np
+
+from .filesystem import FileSystem
+from .import_options import ImportOptions
+
+# the circular primitives of the library are generated at any number of segments instead of being read from their files
+# n-dcyli, n-ddisc, n-dedge, n-dringr and n-dconr are n/d of a circle with radius 1 on the xz plane, see https://www.ldraw.org/library/primref/
+# the 48\ and 8\ versions of them are the same with 3 times and half as many segments
+# stud.dat is the cylinder, disc and edges it is made of, all in one
+# the geometry is what the files have, so a part built with it is the same as one built from the files other than the number of segments
+
+# <resolution folder>\<numerator>-<denominator><kind><radius>.dat
+primitive_pattern = re.compile(r"^(?:(48|8)[\\/])?(\d+)-(\d+)(cyli|disc|edge|ring|con)(\d*)\.dat$")
+
+# (filename, segments): [(line_type, color_code, (n, vertex count, 3) array)], kept between imports since it never changes
+primitive_cache = {}
+
+
+def is_used():
+    return ImportOptions.procedural_primitives
+
+
+# resolution is one of the values of FileSystem.resolution_choices, the number of segments is changed by the same amount as the folders of that resolution
+# None is FileSystem.resolution
+def get_segments(filename, resolution=None):
+    if resolution is None:
+        resolution = FileSystem.resolution_value()
+
+    segments = ImportOptions.primitive_segments
+    match = primitive_pattern.match(filename)
+    folder = match.group(1) if match is not None else None
+    if folder == "48" or resolution == "High":
+        segments *= 3
+    elif folder == "8" or resolution == "Low":
+        segments //= 2
+    return max(3, segments)
+
+
+def is_primitive(filename):
+    if filename == "stud.dat":
+        return True
+
+    match = primitive_pattern.match(filename)
+    if match is None:
+        return False
+
+    numerator, denominator = int(match.group(2)), int(match.group(3))
+    kind, radius = match.group(4), match.group(5)
+    if denominator < 1 or numerator < 1 or numerator > denominator:
+        return False
+    # rings and cones have a radius, the rest don't
+    return (radius != "") == (kind in ["ring", "con"])
+
+
+# the lines of filename as (line_type, color_code, (n, vertex count, 3) array) with the given number of segments for a whole circle
+def get_lines(filename, segments):
+    key = (filename, segments)
+    lines = primitive_cache.get(key)
+    if lines is None:
+        if filename == "stud.dat":
+            lines = __stud_lines(segments)
+        else:
+            match = primitive_pattern.match(filename)
+            fraction = int(match.group(2)) / int(match.group(3))
+            radius = int(match.group(5)) if match.group(5) != "" else 0
+            lines = __kind_lines(match.group(4), fraction, radius, segments)
+        primitive_cache[key] = lines
+    return lines
+
+
+def __kind_lines(kind, fraction, radius, segments):
+    if kind == "cyli":
+        return __cone_lines(fraction, 1, 1, segments)
+    if kind == "con":
+        return __cone_lines(fraction, radius + 1, radius, segments)
+    if kind == "disc":
+        return __ring_lines(fraction, 0, 1, segments)
+    if kind == "ring":
+        return __ring_lines(fraction, radius, radius + 1, segments)
+    if kind == "edge":
+        return __edge_lines(fraction, 1, segments)
+    return []
+
+
+# the points of fraction of a circle with one more point on either end for the conditional lines
+# the points are only as many segments as make up fraction, so a fraction isn't always exactly fraction of the whole circle
+def __circle(fraction, segments):
+    count = max(1, round(segments * fraction))
+    angles = np.arange(-1, count + 2) * (2 * math.pi * fraction / count)
+    points = np.zeros((len(angles), 3))
+    points[:, 0] = np.cos(angles)
+    points[:, 2] = np.sin(angles)
+    # clean up floating point errors
+    return np.round(points, 6)
+
+
+# the side of a cone from bottom_radius at y = 0 to top_radius at y = 1, which is a cylinder if they're the same
+def __cone_lines(fraction, bottom_radius, top_radius, segments):
+    points = __circle(fraction, segments)
+    top = points * top_radius + (0, 1, 0)
+    bottom = points * bottom_radius
+
+    # the first and last points are only for the conditional lines
+    quads = np.stack([top[1:-2], top[2:-1], bottom[2:-1], bottom[1:-2]], axis=1)
+    conditional_lines = np.stack([top[1:-1], bottom[1:-1], top[:-2], top[2:]], axis=1)
+    # a whole circle ends where it starts, so that line is only there once
+    if fraction == 1:
+        conditional_lines = conditional_lines[:-1]
+    return [("4", "16", quads), ("5", "24", conditional_lines)]
+
+
+# a flat ring from inner_radius to outer_radius at y = 0, which is a disc if inner_radius is 0
+def __ring_lines(fraction, inner_radius, outer_radius, segments):
+    points = __circle(fraction, segments)[1:-1]
+    inner = points * inner_radius
+    outer = points * outer_radius
+
+    if inner_radius == 0:
+        triangles = np.stack([inner[:-1], outer[:-1], outer[1:]], axis=1)
+        return [("3", "16", triangles)]
+
+    quads = np.stack([inner[:-1], outer[:-1], outer[1:], inner[1:]], axis=1)
+    return [("4", "16", quads)]
+
+
+def __edge_lines(fraction, radius, segments):
+    points = __circle(fraction, segments)[1:-1] * radius
+    lines = np.stack([points[:-1], points[1:]], axis=1)
+    return [("2", "24", lines)]
+
+
+# stud.dat is a cylinder with a radius of 6 from y = 0 up to y = -4, with a disc on top and edges around the top and bottom
+def __stud_lines(segments):
+    lines = []
+    for line_type, color_code, vertices in __cone_lines(1, 1, 1, segments):
+        vertices = vertices * (6, -4, 6)
+        # flipping y turns the faces inside out, so their winding is reversed to keep them facing out
+        if line_type == "4":
+            vertices = vertices[:, ::-1]
+        lines.append((line_type, color_code, vertices))
+
+    for line_type, color_code, vertices in __ring_lines(1, 0, 1, segments):
+        lines.append((line_type, color_code, vertices * (6, 1, 6) + (0, -4, 0)))
+
+    for y in [0, -4]:
+        for line_type, color_code, vertices in __edge_lines(1, 1, segments):
+            lines.append((line_type, color_code, vertices * (6, 1, 6) + (0, y, 0)))
+    return lines
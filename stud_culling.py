@@ -0,0 +1,170 @@
+import numpy as np
+
+from .import_options import ImportOptions
+from . import matrices
+
+# a stud is hidden if the anti-stud of another part is where the stud is and points the same way
+# an anti-stud is where a stud on top of a part would be, moved down to the bottom of the part
+# so a part on top of another part hides every stud of the other part that it could be attached to
+# only the parts under the root model are looked at, see add_anti_studs
+
+# how far apart in LDU a stud and an anti-stud can be and still be in the same place
+tolerance = 0.5
+# the size of a stud primitive, which goes from its origin up to -stud_height
+stud_radius = 6
+stud_height = 4
+# how far outside of a stud the geometry that is removed with it can be
+stud_margin = 0.01
+
+# (x, y, z) cell of the spatial hash: list of (position, direction) of every anti-stud in that cell
+anti_studs = {}
+# ldraw_file: (n, 4, 4) array of the matrix of every stud in ldraw_file
+stud_matrices = {}
+
+
+def reset_caches():
+    anti_studs.clear()
+    stud_matrices.clear()
+
+
+def is_used():
+    return ImportOptions.hide_covered_studs and not ImportOptions.no_studs
+
+
+# the matrix of every stud primitive used by ldraw_file and its subfiles, in the space of ldraw_file
+# studs are only looked for in part files since a model's parts have their own studs
+def get_stud_matrices(ldraw_file):
+    _matrices = stud_matrices.get(ldraw_file)
+    if _matrices is None:
+        found = []
+        stack = [(ldraw_file, np.identity(4))]
+        while len(stack) > 0:
+            _file, matrix = stack.pop()
+            for child_node in _file.child_nodes:
+                if child_node.meta_command != "1":
+                    continue
+                child_matrix = matrix @ np.array(child_node.matrix, dtype=np.float64)
+                if child_node.file.is_stud():
+                    found.append(child_matrix)
+                elif child_node.file.is_like_part() or not child_node.file.is_like_model():
+                    stack.append((child_node.file, child_matrix))
+        _matrices = np.array(found, dtype=np.float64).reshape(-1, 4, 4)
+        stud_matrices[ldraw_file] = _matrices
+    return _matrices
+
+
+# the anti-studs of ldraw_file in its own space as positions and directions
+# bounds is the bounds of the geometry of ldraw_file, whose bottom is the largest y since -y is up
+# only studs on top of the part have anti-studs, studs on its sides don't go through it
+def __get_local_anti_studs(ldraw_file, bounds):
+    _matrices = get_stud_matrices(ldraw_file)
+    if len(_matrices) < 1 or bounds is None:
+        return np.zeros((0, 3)), np.zeros((0, 3))
+
+    directions = __get_directions(_matrices)
+    positions = _matrices[:, :3, 3].copy()
+    bottom = bounds[1][1]
+    on_top = (directions[:, 1] < -0.999) & (bottom - positions[:, 1] > tolerance)
+
+    positions = positions[on_top]
+    positions[:, 1] = bottom
+    return positions, directions[on_top]
+
+
+# add the anti-stud of every part placed by ldraw_file
+# positions are in the space parts are placed in by load, which is LDraw's space rotated into blender's
+def add_anti_studs(ldraw_file):
+    from .ldraw_node import LDrawNode
+
+    if ldraw_file.is_like_part() or not ldraw_file.is_like_model():
+        return
+
+    placements = LDrawNode.get_placements(ldraw_file)
+    local_anti_studs = {}
+    rotation = np.array(matrices.rotation_matrix, dtype=np.float64)
+    for ldraw_node, matrix in zip(placements.nodes, placements.matrices):
+        part_file = ldraw_node.file
+        local = local_anti_studs.get(part_file)
+        if local is None:
+            local = __get_local_anti_studs(part_file, LDrawNode.get_part_bounds(part_file))
+            local_anti_studs[part_file] = local
+
+        positions, directions = local
+        if len(positions) < 1:
+            continue
+
+        matrix = rotation @ matrix
+        positions = positions @ matrix[:3, :3].T + matrix[:3, 3]
+        directions = __normalized(directions @ matrix[:3, :3].T)
+        for position, direction in zip(positions, directions):
+            anti_studs.setdefault(__get_cell(position), []).append((position, direction))
+
+
+# the indices of the studs of ldraw_file that are hidden when it's placed with obj_matrix, as a tuple
+def get_hidden_studs(ldraw_file, obj_matrix):
+    if len(anti_studs) < 1:
+        return ()
+
+    _matrices = get_stud_matrices(ldraw_file)
+    if len(_matrices) < 1:
+        return ()
+
+    # meshes are rotated into blender's coordinates when they're created, so parts are placed with obj_matrix @ rotation_matrix
+    matrix = np.array(obj_matrix, dtype=np.float64) @ np.array(matrices.rotation_matrix, dtype=np.float64)
+    _matrices = matrix @ _matrices
+    positions = _matrices[:, :3, 3]
+    directions = __get_directions(_matrices)
+
+    hidden = []
+    for i, (position, direction) in enumerate(zip(positions, directions)):
+        if __is_covered(position, direction):
+            hidden.append(i)
+    return tuple(hidden)
+
+
+# remove the faces, edges and lines of geometry_data that are entirely inside one of the hidden studs of ldraw_file
+def remove_hidden_studs(geometry_data, ldraw_file, hidden_studs):
+    inverse_matrices = np.linalg.inv(get_stud_matrices(ldraw_file)[list(hidden_studs)])
+    for name in ["face_data", "edge_data", "line_data"]:
+        face_data = getattr(geometry_data, name)
+        if len(face_data) < 1:
+            continue
+
+        vertices = face_data.get_vertices().astype(np.float64)
+        vertex_hidden = np.zeros(len(vertices), dtype=bool)
+        for inverse_matrix in inverse_matrices:
+            local = vertices @ inverse_matrix[:3, :3].T + inverse_matrix[:3, 3]
+            radius = np.hypot(local[:, 0], local[:, 2])
+            vertex_hidden |= (radius <= stud_radius + stud_margin) & (local[:, 1] >= -stud_height - stud_margin) & (local[:, 1] <= stud_margin)
+
+        # an item is hidden only if all of its vertices are
+        sizes = np.frombuffer(face_data.sizes, dtype=np.int32)
+        hidden = np.logical_and.reduceat(vertex_hidden, np.cumsum(sizes) - sizes)
+        if np.any(hidden):
+            setattr(geometry_data, name, face_data.select(~hidden))
+
+
+# the -y of each matrix, which is the way a stud points
+def __get_directions(_matrices):
+    return __normalized(-_matrices[:, :3, 1])
+
+
+def __normalized(vectors):
+    lengths = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.where(lengths > 0, lengths, 1)
+
+
+def __get_cell(position):
+    return tuple(np.floor(position / tolerance).astype(int))
+
+
+# look in the cells around position, since anything within tolerance can be in the next cell over
+def __is_covered(position, direction):
+    x, y, z = __get_cell(position)
+    for i in (x - 1, x, x + 1):
+        for j in (y - 1, y, y + 1):
+            for k in (z - 1, z, z + 1):
+                for anti_stud_position, anti_stud_direction in anti_studs.get((i, j, k), ()):
+                    if np.linalg.norm(anti_stud_position - position) <= tolerance and anti_stud_direction.dot(direction) > 0.999:
+                        return True
+    return False
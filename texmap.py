@@ -1,10 +1,7 @@
-import mathutils
+import numpy as np
 
-import math
 import uuid
 
-from . import helpers
-
 texmap_prefix = "0 !: "
 
 
@@ -38,12 +35,13 @@ class TexMap:
         return self.method == 'SPHERICAL'
 
     def uv_unwrap_face(self, bm, face):
-        if self.is_planar():
-            self.__map_planar(bm, face)
-        elif self.is_cylindrical():
-            self.__map_cylindrical(bm, face)
-        elif self.is_spherical():
-            self.__map_spherical(bm, face)
+        uvs = self.project_uvs([loop.vert.co for loop in face.loops])
+        if uvs is None:
+            return
+
+        uv_layer = bm.loops.layers.uv.verify()
+        for loop, uv in zip(face.loops, uvs.tolist()):
+            loop[uv_layer].uv = uv
 
     def uv_unwrap_face_basic(self, bm, face):
         uv_layer = bm.loops.layers.uv.verify()
@@ -55,23 +53,33 @@ class TexMap:
                 uvs[p] = uv
             loop[uv_layer].uv = uvs[p]
 
+    # the uv of every point in vertices, an (n, 3) array, as an (n, 2) array
+    # a uv only depends on where its vertex is, so every vertex of every face that uses this texmap can be projected at once
+    # None if the method isn't known
+    def project_uvs(self, vertices):
+        vertices = np.asarray(vertices, dtype=np.float64).reshape(-1, 3)
+        if self.is_planar():
+            return self.__project_planar(vertices)
+        elif self.is_cylindrical():
+            return self.__project_cylindrical(vertices)
+        elif self.is_spherical():
+            return self.__project_spherical(vertices)
+        return None
+
     # negative v because blender uv starts at bottom left of image, LDraw orientation of up=-y so use top left
-    def __map_planar(self, bm, face):
-        a = self.parameters[0]
-        b = self.parameters[1]
-        c = self.parameters[2]
+    def __project_planar(self, vertices):
+        a, b, c = [np.array(p, dtype=np.float64) for p in self.parameters[0:3]]
 
         ab = b - a
-        bc = c - b
         ac = c - a
 
         # texmap_cross = ab.cross(ac)
         # texmap_normal = texmap_cross / texmap_cross.length
 
-        p1_length = ab.length
+        p1_length = np.linalg.norm(ab)
         p1_normal = ab / p1_length
 
-        p2_length = ac.length
+        p2_length = np.linalg.norm(ac)
         p2_normal = ac / p2_length
 
         # https://blender.stackexchange.com/a/53808
@@ -84,89 +92,70 @@ class TexMap:
         # https://mathinsight.org/distance_point_plane
         # absolute value of the dot product of the normal and
         # the length between the point and a point on the plane
-        # TODO: UV PROJECT HERE
-        uv_layer = bm.loops.layers.uv.verify()
-        uvs = {}
-        for i, loop in enumerate(face.loops):
-            p = loop.vert.co.copy().freeze()
-            if p not in uvs:
-                du = p1_normal.dot(p - a) / p1_length
-                dv = p2_normal.dot(p - c) / p2_length
-                # - up_length to move uv to bottom left in blender
-                uv = [du, -dv]
-                uvs[p] = uv
-            loop[uv_layer].uv = uvs[p]
-
-    def __map_cylindrical(self, bm, face):
-        a = self.parameters[0]
-        b = self.parameters[1]
-        c = self.parameters[2]
+        du = (vertices - a) @ p1_normal / p1_length
+        dv = (vertices - c) @ p2_normal / p2_length
+        # - up_length to move uv to bottom left in blender
+        return np.stack((du, -dv), axis=-1)
+
+    # a plane is a normal and a distance so that a point's distance to it is point dot normal + distance
+    # only the normal of the front plane is used
+    def __project_cylindrical(self, vertices):
+        a, b, c = [np.array(p, dtype=np.float64) for p in self.parameters[0:3]]
         angle1 = self.parameters[3]
 
         up = a - b
-        up_length = up.length
-        front = (c - b).normalized()
+        up_length = np.linalg.norm(up)
+        front = TexMap.__normalized(c - b)
         plane_1_normal = up / up_length
-        plane_2_normal = front.cross(up).normalized()
-        front_plane = mathutils.Vector(tuple(front) + (-front.dot(b),))
-        up_length = up_length
-        plane_1 = mathutils.Vector(tuple(plane_1_normal) + (-plane_1_normal.dot(b),))
-        plane_2 = mathutils.Vector(tuple(plane_2_normal) + (-plane_2_normal.dot(b),))
+        plane_2_normal = TexMap.__normalized(np.cross(front, up))
+        plane_1_distance = -plane_1_normal.dot(b)
+        plane_2_distance = -plane_2_normal.dot(b)
         angle_1 = 360.0 / angle1
 
-        uv_layer = bm.loops.layers.uv.verify()
-        uvs = {}
-        for i, loop in enumerate(face.loops):
-            p = loop.vert.co.copy().freeze()
-            if p not in uvs:
-                # - up_length to move uv to bottom left in blender
-                dot_plane_1 = mathutils.Vector((p[0], p[1] - up_length, p[2],) + (1.0,)).dot(plane_1)
-                point_in_plane_1 = p - mathutils.Vector((plane_1[0], plane_1[1], plane_1[2],)) * dot_plane_1
-                dot_front_plane = point_in_plane_1.dot(front_plane)
-                dot_plane_2 = mathutils.Vector(tuple(point_in_plane_1) + (1.0,)).dot(plane_2)
-
-                _angle_1 = math.atan2(dot_plane_2, dot_front_plane) / math.pi * angle_1
-                du = helpers.clamp(0.5 + 0.5 * _angle_1, 0, 1)
-                dv = dot_plane_1 / up_length
-                uv = [du, -dv]
-                uvs[p] = uv
-            loop[uv_layer].uv = uvs[p]
+        # - up_length to move uv to bottom left in blender
+        dot_plane_1 = (vertices - (0.0, up_length, 0.0)) @ plane_1_normal + plane_1_distance
+        point_in_plane_1 = vertices - np.outer(dot_plane_1, plane_1_normal)
+        dot_front_plane = point_in_plane_1 @ front
+        dot_plane_2 = point_in_plane_1 @ plane_2_normal + plane_2_distance
 
-    def __map_spherical(self, bm, face):
-        a = self.parameters[0]
-        b = self.parameters[1]
-        c = self.parameters[2]
+        _angle_1 = np.arctan2(dot_plane_2, dot_front_plane) / np.pi * angle_1
+        du = np.clip(0.5 + 0.5 * _angle_1, 0, 1)
+        dv = dot_plane_1 / up_length
+        return np.stack((du, -dv), axis=-1)
+
+    def __project_spherical(self, vertices):
+        a, b, c = [np.array(p, dtype=np.float64) for p in self.parameters[0:3]]
         angle1 = self.parameters[3]
         angle2 = self.parameters[4]
 
-        front = (b - a).normalized()
-        plane_1_normal = front.cross(c - a).normalized()
-        plane_2_normal = plane_1_normal.cross(front).normalized()
-        front_plane = mathutils.Vector(tuple(front) + (-front.dot(a),))
+        front = TexMap.__normalized(b - a)
+        plane_1_normal = TexMap.__normalized(np.cross(front, c - a))
+        plane_2_normal = TexMap.__normalized(np.cross(plane_1_normal, front))
         center = a
-        plane_1 = mathutils.Vector(tuple(plane_1_normal) + (-plane_1_normal.dot(a),))
-        plane_2 = mathutils.Vector(tuple(plane_2_normal) + (-plane_2_normal.dot(a),))
+        plane_1_distance = -plane_1_normal.dot(a)
         angle_1 = 360.0 / angle1
         angle_2 = 180.0 / angle2
 
-        uv_layer = bm.loops.layers.uv.verify()
-        uvs = {}
-        for i, loop in enumerate(face.loops):
-            p = loop.vert.co.copy().freeze()
-            if p not in uvs:
-                vertex_direction = p - center
-
-                dot_plane_1 = mathutils.Vector((p[0], p[1], p[2],) + (1.0,)).dot(plane_1)
-                point_in_plane_1 = p - mathutils.Vector((plane_1[0], plane_1[1], plane_1[2],)) * dot_plane_1
-                dot_front_plane = point_in_plane_1.dot(front_plane)
-                dot_plane_2 = point_in_plane_1.dot(plane_2)
-
-                _angle_1 = math.atan2(dot_plane_2, dot_front_plane) / math.pi * angle_1
-                du = 0.5 + 0.5 * _angle_1
-                _angle_2 = math.asin(dot_plane_1 / vertex_direction.length) / math.pi * angle_2
-                # -0.5 instead of 0.5 to move uv to bottom left in blender
-                dv = -0.5 - _angle_2
-
-                uv = [du, -dv]
-                uvs[p] = uv
-            loop[uv_layer].uv = uvs[p]
+        vertex_distance = np.linalg.norm(vertices - center, axis=-1)
+
+        dot_plane_1 = vertices @ plane_1_normal + plane_1_distance
+        point_in_plane_1 = vertices - np.outer(dot_plane_1, plane_1_normal)
+        dot_front_plane = point_in_plane_1 @ front
+        dot_plane_2 = point_in_plane_1 @ plane_2_normal
+
+        _angle_1 = np.arctan2(dot_plane_2, dot_front_plane) / np.pi * angle_1
+        du = 0.5 + 0.5 * _angle_1
+        # a vertex at the center has no direction, so it's on the equator
+        with np.errstate(divide="ignore", invalid="ignore"):
+            sin_2 = np.where(vertex_distance > 0, dot_plane_1 / vertex_distance, 0.0)
+        _angle_2 = np.arcsin(np.clip(sin_2, -1.0, 1.0)) / np.pi * angle_2
+        # -0.5 instead of 0.5 to move uv to bottom left in blender
+        dv = -0.5 - _angle_2
+        return np.stack((du, -dv), axis=-1)
+
+    @staticmethod
+    def __normalized(vector):
+        length = np.linalg.norm(vector)
+        if length == 0:
+            return vector
+        return vector / length
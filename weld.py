@@ -0,0 +1,71 @@
+import numpy as np
+
+
+# merge every vertex that is within distance of another vertex, like bmesh.ops.remove_doubles
+# vertices are put into cells of a grid that are distance wide, so only the vertices in a cell and the cells around it have to be compared
+# vertices that are close to each other are merged even if the first and last of them are further apart than distance
+# each group of merged vertices is moved to the first of them
+# returns the merged vertices and the index into them of every vertex of vertices
+def weld_vertices(vertices, distance):
+    vertices = np.asarray(vertices)
+    if len(vertices) < 1 or distance <= 0:
+        return vertices, np.arange(len(vertices))
+
+    labels = __get_labels(vertices, distance)
+    firsts, indices = np.unique(labels, return_inverse=True)
+    return vertices[firsts], indices.reshape(-1)
+
+
+# the index of the first vertex of the group each vertex is merged into
+def __get_labels(vertices, distance):
+    cells = np.floor(vertices / distance).astype(np.int64)
+    cells -= cells.min(axis=0) - 1
+    # one empty cell on either side so the cells around every cell have codes too
+    dims = cells.max(axis=0) + 2
+    codes = (cells[:, 0] * dims[1] + cells[:, 1]) * dims[2] + cells[:, 2]
+
+    order = np.argsort(codes, kind="stable")
+    cell_codes, starts, counts = np.unique(codes[order], return_index=True, return_counts=True)
+
+    labels = np.arange(len(vertices))
+    pairs_i = []
+    pairs_j = []
+    for dx in (-1, 0, 1):
+        for dy in (-1, 0, 1):
+            for dz in (-1, 0, 1):
+                neighbor_codes = cell_codes + (dx * dims[1] + dy) * dims[2] + dz
+                found = np.searchsorted(cell_codes, neighbor_codes)
+                found = np.minimum(found, len(cell_codes) - 1)
+                matched = cell_codes[found] == neighbor_codes
+                i, j = __cell_pairs(order, starts, counts, np.flatnonzero(matched), found[matched])
+                close = np.einsum('ij,ij->i', vertices[i] - vertices[j], vertices[i] - vertices[j]) <= distance * distance
+                pairs_i.append(i[close])
+                pairs_j.append(j[close])
+
+    pairs_i = np.concatenate(pairs_i)
+    pairs_j = np.concatenate(pairs_j)
+
+    # every vertex takes the smallest label of the vertices close to it until nothing changes
+    while True:
+        new_labels = labels.copy()
+        np.minimum.at(new_labels, pairs_i, labels[pairs_j])
+        new_labels = new_labels[new_labels]
+        if np.array_equal(new_labels, labels):
+            return labels
+        labels = new_labels
+
+
+# every pair of a vertex of cell a and a vertex of cell b for each of the cells in cells_a and cells_b
+def __cell_pairs(order, starts, counts, cells_a, cells_b):
+    counts_a = counts[cells_a]
+    counts_b = counts[cells_b]
+    pair_counts = counts_a * counts_b
+    total = int(pair_counts.sum())
+    if total < 1:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+
+    cell_pair = np.repeat(np.arange(len(cells_a)), pair_counts)
+    within = np.arange(total) - np.repeat(np.cumsum(pair_counts) - pair_counts, pair_counts)
+    i = order[starts[cells_a][cell_pair] + within // counts_b[cell_pair]]
+    j = order[starts[cells_b][cell_pair] + within % counts_b[cell_pair]]
+    return i, j